@@ -1,6 +1,19 @@
 from django.apps import AppConfig
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
 
 
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
+
+    def ready(self):
+        # Отозванный токен сбрасывается только в кеше процесса, который
+        # обработал запрос, поэтому без общего кеша другие процессы
+        # принимали бы его до истечения записи.
+        if settings.AUTH_TOKEN_CACHE_TTL and not settings.SHARED_CACHE:
+            raise ImproperlyConfigured(
+                'Кеш токенов (AUTH_TOKEN_CACHE_TTL) требует общего кеша '
+                'Django: Redis или Memcached в CACHE_BACKEND.'
+            )
+        from api import signals  # noqa: F401
@@ -0,0 +1,59 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.authentication import TokenAuthentication
+
+from api.cache_stats import CacheStatsMixin
+
+
+class TokenCache(CacheStatsMixin):
+    """Кеш пользователей по токенам со ссылкой на запись по id пользователя."""
+    prefix = 'auth'
+
+    @property
+    def ttl(self):
+        return settings.AUTH_TOKEN_CACHE_TTL
+
+    def get_key(self, token_key):
+        digest = hashlib.sha256(token_key.encode()).hexdigest()
+        return f'{self.prefix}:token:{digest}'
+
+    def get_user_key(self, user_id):
+        return f'{self.prefix}:user:{user_id}'
+
+    def get(self, token_key):
+        entry = cache.get(self.get_key(token_key))
+        self.count('misses' if entry is None else 'hits')
+        return entry
+
+    def set(self, token_key, user, token):
+        key = self.get_key(token_key)
+        cache.set_many(
+            {key: (user, token), self.get_user_key(user.pk): key},
+            timeout=self.ttl
+        )
+
+    def delete(self, token_key):
+        cache.delete(self.get_key(token_key))
+
+    def delete_user(self, user_id):
+        user_key = self.get_user_key(user_id)
+        key = cache.get(user_key)
+        cache.delete_many([user_key] if key is None else [user_key, key])
+
+
+token_cache = TokenCache()
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """Аутентификация по токену с кешированием пользователя."""
+    def authenticate_credentials(self, key):
+        if not token_cache.ttl:
+            return super().authenticate_credentials(key)
+        entry = token_cache.get(key)
+        if entry is not None:
+            return entry
+        user, token = super().authenticate_credentials(key)
+        token_cache.set(key, user, token)
+        return user, token
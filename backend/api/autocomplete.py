@@ -0,0 +1,110 @@
+import string
+import threading
+from bisect import bisect_left
+from operator import itemgetter
+
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.models import Case, IntegerField, Value, When
+
+from api.catalog import ingredient_catalog
+from foodgram.settings import INGREDIENT_SEARCH_LIMIT
+
+ASCII_UPPER = str.maketrans(string.ascii_lowercase, string.ascii_uppercase)
+
+
+def get_case_folder(using=DEFAULT_DB_ALIAS):
+    """
+    Приведение регистра как в name__icontains: LIKE в SQLite не различает
+    регистр только у букв ASCII, PostgreSQL сравнивает UPPER(name).
+    """
+    if connections[using].vendor == 'sqlite':
+        return lambda value: value.translate(ASCII_UPPER)
+    return str.upper
+
+
+class IngredientPrefixIndex:
+    """Индекс названий ингредиентов в памяти процесса для подсказок."""
+    def __init__(self, catalog):
+        self.catalog = catalog
+        self.source = None
+        self.entries = None
+        self.lock = threading.Lock()
+
+    def build(self, state):
+        fold = get_case_folder()
+        items = sorted(state.items, key=itemgetter('name'))
+        names = [fold(item['name']) for item in items]
+        prefixes = sorted((name, rank) for rank, name in enumerate(names))
+        self.entries = (
+            fold,
+            [item['id'] for item in items],
+            names,
+            [name for name, _ in prefixes],
+            [rank for _, rank in prefixes]
+        )
+        self.source = state
+
+    def get_entries(self):
+        state = self.catalog.get_state()
+        if self.source is not state:
+            with self.lock:
+                self.build(state)
+        return self.entries
+
+    def search(self, value, limit=INGREDIENT_SEARCH_LIMIT):
+        """
+        Возвращает два списка id, вместе не длиннее limit: ингредиенты,
+        названия которых начинаются с value, и остальные ингредиенты,
+        названия которых содержат value. Порядок - как в search_in_database.
+        """
+        fold, ids, names, prefix_names, prefix_ranks = self.get_entries()
+        value = fold(value)
+        ranks = []
+        position = bisect_left(prefix_names, value)
+        while (
+            position < len(prefix_names) and
+            prefix_names[position].startswith(value)
+        ):
+            ranks.append(prefix_ranks[position])
+            position += 1
+        prefixed = [ids[rank] for rank in sorted(ranks)[:limit]]
+        contained = []
+        if len(prefixed) < limit:
+            for name, ingredient_id in zip(names, ids):
+                if value in name and not name.startswith(value):
+                    contained.append(ingredient_id)
+                    if len(prefixed) + len(contained) == limit:
+                        break
+        return prefixed, contained
+
+
+ingredient_index = IngredientPrefixIndex(ingredient_catalog)
+
+
+def search_in_database(queryset, value, limit=INGREDIENT_SEARCH_LIMIT):
+    """
+    Поиск ингредиентов запросом к базе данных. В PostgreSQL условия
+    обслуживаются триграммным индексом по UPPER(name).
+    """
+    return queryset.filter(name__icontains=value).annotate(
+        match_rank=Case(
+            When(name__istartswith=value, then=Value(0)),
+            default=Value(1),
+            output_field=IntegerField()
+        )
+    ).order_by('match_rank', 'name')[:limit]
+
+
+def database_search_enabled(using=DEFAULT_DB_ALIAS):
+    """В PostgreSQL подсказки ищутся по триграммному индексу в базе."""
+    return connections[using].vendor == 'postgresql'
+
+
+def suggest_from_index(value, limit=INGREDIENT_SEARCH_LIMIT):
+    """
+    Подсказки ингредиентов из справочника в памяти процесса, без
+    обращения к базе данных.
+    """
+    prefixed, contained = ingredient_index.search(value, limit)
+    items = ingredient_catalog.get_items_by_id()
+    return [items[ingredient_id] for ingredient_id in prefixed + contained]
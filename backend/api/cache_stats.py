@@ -0,0 +1,27 @@
+from django.core.cache import cache
+
+STATS = ('hits', 'misses')
+
+
+class CacheStatsMixin:
+    """Счётчики попаданий и промахов кеша с префиксом prefix."""
+    prefix = None
+
+    def get_stats_key(self, name):
+        return f'{self.prefix}:stats:{name}'
+
+    def count(self, name):
+        key = self.get_stats_key(name)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, 0, timeout=None)
+            cache.incr(key)
+
+    def get_stats(self):
+        keys = {self.get_stats_key(name): name for name in STATS}
+        stats = cache.get_many(keys)
+        return {name: stats.get(key, 0) for key, name in keys.items()}
+
+    def reset_stats(self):
+        cache.delete_many([self.get_stats_key(name) for name in STATS])
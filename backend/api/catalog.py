@@ -0,0 +1,67 @@
+import threading
+import time
+from collections import namedtuple
+
+from django.core.cache import cache
+
+from foodgram.settings import CATALOG_TTL
+from recipes.models import Ingredient, Tag
+
+CatalogState = namedtuple(
+    'CatalogState', ('version', 'loaded_at', 'items', 'items_by_id')
+)
+
+
+class Catalog:
+    """Кеш справочных данных в памяти процесса с версией в кеше Django."""
+    def __init__(self, model, fields, ttl=CATALOG_TTL):
+        self.model = model
+        self.fields = fields
+        self.ttl = ttl
+        self.version_key = f'catalog:{model._meta.label_lower}:version'
+        self.state = None
+        self.lock = threading.Lock()
+
+    def get_version(self):
+        version = cache.get(self.version_key)
+        if version is None:
+            cache.add(self.version_key, time.time_ns(), timeout=None)
+            return cache.get(self.version_key)
+        return version
+
+    def bump(self):
+        cache.set(self.version_key, time.time_ns(), timeout=None)
+
+    def get_state(self):
+        version = self.get_version()
+        state = self.state
+        if state is None or state.version != version or (
+            time.monotonic() - state.loaded_at > self.ttl
+        ):
+            with self.lock:
+                items = list(self.model.objects.values(*self.fields))
+                state = CatalogState(
+                    version=version,
+                    loaded_at=time.monotonic(),
+                    items=items,
+                    items_by_id={item['id']: item for item in items}
+                )
+                self.state = state
+        return state
+
+    def get_items(self):
+        return self.get_state().items
+
+    def get_items_by_id(self):
+        return self.get_state().items_by_id
+
+    def get_item(self, pk):
+        try:
+            return self.get_items_by_id().get(int(pk))
+        except (TypeError, ValueError):
+            return None
+
+
+tag_catalog = Catalog(Tag, ('id', 'name', 'color', 'slug'))
+
+ingredient_catalog = Catalog(Ingredient, ('id', 'name', 'measurement_unit'))
@@ -0,0 +1,16 @@
+from django.utils.cache import patch_cache_control, patch_vary_headers
+
+from foodgram.settings import EDGE_CACHE_MAX_AGE
+
+
+def set_cache_headers(response, shared, vary=()):
+    """Заголовки кеширования общего (shared) или личного ответа."""
+    patch_vary_headers(response, ('Accept', 'Authorization', *vary))
+    if not shared:
+        patch_cache_control(response, private=True, no_cache=True)
+        return
+    patch_cache_control(
+        response, public=True, max_age=0, s_maxage=EDGE_CACHE_MAX_AGE
+    )
+    # Заголовок для nginx, который он не передаёт клиенту.
+    response['X-Accel-Expires'] = EDGE_CACHE_MAX_AGE
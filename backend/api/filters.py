@@ -1,27 +1,94 @@
 from django.contrib.auth import get_user_model
-from django.db.models import Q
 from django_filters.rest_framework import FilterSet
 from django_filters.rest_framework.filters import (BooleanFilter, CharFilter,
-                                                   ModelMultipleChoiceFilter)
+                                                   ChoiceFilter,
+                                                   MultipleChoiceFilter)
 
-from recipes.models import Ingredient, Recipe, Tag
+from api.autocomplete import search_in_database
+from api.catalog import tag_catalog
+from recipes.models import Ingredient, Recipe
 
 User = get_user_model()
 
 
+TAGS_MODE_ANY = 'any'
+
+TAGS_MODE_ALL = 'all'
+
+TAGS_MODES = (
+    (TAGS_MODE_ANY, 'Хотя бы один из тегов'),
+    (TAGS_MODE_ALL, 'Все теги'),
+)
+
+ORDERING_NEW = 'new'
+
+ORDERING_POPULAR = 'popular'
+
+ORDERINGS = (
+    (ORDERING_NEW, 'Сначала новые'),
+    (ORDERING_POPULAR, 'Сначала популярные'),
+)
+
+# Фильтры, результат которых зависит от текущего пользователя.
+PERSONAL_FILTERS = ('is_favorited', 'is_in_shopping_cart')
+
+
+def get_tag_choices():
+    return [(tag['slug'], tag['name']) for tag in tag_catalog.get_items()]
+
+
+def get_tag_ids_by_slug():
+    return {tag['slug']: tag['id'] for tag in tag_catalog.get_items()}
+
+
 class RecipeFilter(FilterSet):
     is_favorited = BooleanFilter(method='filter_is_favorited')
     is_in_shopping_cart = BooleanFilter(method='filter_is_in_shopping_cart')
-    tags = ModelMultipleChoiceFilter(
-        queryset=Tag.objects.all(),
-        field_name='tags__slug',
-        to_field_name='slug'
+    tags = MultipleChoiceFilter(
+        choices=get_tag_choices,
+        method='filter_tags'
+    )
+    tags_mode = ChoiceFilter(
+        choices=TAGS_MODES,
+        method='filter_tags_mode'
+    )
+    search = CharFilter(method='filter_search')
+    ordering = ChoiceFilter(
+        choices=ORDERINGS,
+        method='filter_ordering'
     )
 
     class Meta:
         model = Recipe
         fields = ('author',)
 
+    def filter_tags(self, queryset, _, value):
+        """
+        По умолчанию рецепт подходит, если у него есть хотя бы один из
+        тегов, с tags_mode=all - если есть все теги.
+        """
+        tag_ids = get_tag_ids_by_slug()
+        return queryset.with_tags(
+            [tag_ids[slug] for slug in value],
+            match_all=self.form.cleaned_data.get('tags_mode') == TAGS_MODE_ALL
+        )
+
+    def filter_tags_mode(self, queryset, *args):
+        return queryset
+
+    def filter_search(self, queryset, _, value):
+        """Полнотекстовый поиск по названию и описанию рецепта."""
+        return queryset.search(value)
+
+    def filter_ordering(self, queryset, _, value):
+        """
+        С ordering=popular рецепты идут от чаще добавляемых в избранное
+        к реже, по сохранённому счётчику и индексу на нём.
+        """
+        if value == ORDERING_POPULAR:
+            return queryset.popular()
+        return queryset
+
     def filter_is_favorited(self, queryset, _, value):
         user = self.request.user
         if not user.is_authenticated:
@@ -47,4 +114,4 @@ class IngredientFilter(FilterSet):
         fields = ('name',)
 
     def filter_name(self, queryset, name, value):
-        return queryset.filter(Q(name__icontains=value))
+        return search_in_database(queryset, value)
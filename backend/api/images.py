@@ -0,0 +1,226 @@
+import base64
+import binascii
+import hashlib
+import io
+import logging
+import os
+import queue
+import tempfile
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections
+from django.utils import timezone
+from PIL import Image, ImageOps, features
+
+from api.response_cache import RECIPES_TAG, recipe_tag, response_cache
+from foodgram.settings import (FILE_UPLOAD_MAX_MEMORY_SIZE,
+                               RECIPE_IMAGE_DECODE_CHUNK_SIZE,
+                               RECIPE_IMAGE_FALLBACK_FORMAT,
+                               RECIPE_IMAGE_FORMAT, RECIPE_IMAGE_MAX_SIZE,
+                               RECIPE_IMAGE_QUALITY, RECIPE_IMAGE_VARIANTS)
+from recipes.models import Recipe
+
+logger = logging.getLogger(__name__)
+
+FORMAT_EXTENSIONS = {
+    'WEBP': 'webp', 'JPEG': 'jpg', 'PNG': 'png', 'GIF': 'gif'
+}
+
+
+class ImageTooLargeError(ValueError):
+    """Размер изображения превышает допустимый."""
+
+
+def decode_base64_image(data, max_size=RECIPE_IMAGE_MAX_SIZE,
+                        chunk_size=RECIPE_IMAGE_DECODE_CHUNK_SIZE):
+    """Декодирует data:image/...;base64 во временный файл с именем по хешу."""
+    _, separator, encoded = data.partition(';base64,')
+    if not separator:
+        raise ValueError('Строка не содержит данных в base64.')
+    if len(encoded) // 4 * 3 - encoded[-2:].count('=') > max_size:
+        raise ImageTooLargeError(max_size)
+    chunk_size -= chunk_size % 4
+    digest = hashlib.sha256()
+    file = tempfile.SpooledTemporaryFile(
+        max_size=FILE_UPLOAD_MAX_MEMORY_SIZE
+    )
+    try:
+        for start in range(0, len(encoded), chunk_size):
+            chunk = base64.b64decode(
+                encoded[start:start + chunk_size], validate=True
+            )
+            digest.update(chunk)
+            file.write(chunk)
+    except binascii.Error as error:
+        file.close()
+        raise ValueError('Некорректные данные в base64.') from error
+    file.seek(0)
+    return File(file, name=digest.hexdigest())
+
+
+def get_image_extension(file):
+    """
+    Проверяет картинку средствами Pillow без загрузки её в память целиком
+    и возвращает расширение файла по её формату.
+    """
+    try:
+        with Image.open(file) as image:
+            image_format = image.format
+            image.verify()
+    except Exception as error:
+        raise ValueError('Файл не является картинкой.') from error
+    finally:
+        file.seek(0)
+    if image_format not in FORMAT_EXTENSIONS:
+        raise ValueError(f'Формат {image_format} не поддерживается.')
+    return FORMAT_EXTENSIONS[image_format]
+
+
+class DecodedImage(File):
+    """
+    Проверенная картинка, ещё не сохранённая в хранилище: сериализатор
+    сохраняет её только после проверки всех полей, чтобы в хранилище
+    не оставались файлы отклонённых запросов.
+    """
+    def store(self):
+        with self:
+            return store_image(self, self.name)
+
+
+def store_image(file, name):
+    """
+    Сохраняет файл изображения под именем name. Имя строится по хешу
+    содержимого, поэтому повторно загруженная картинка не сохраняется
+    второй раз, а используется уже лежащий в хранилище файл.
+    """
+    if default_storage.exists(name):
+        return name
+    file.seek(0)
+    return default_storage.save(name, file)
+
+
+def get_variants_format():
+    """Формат вариантов картинки; без поддержки WebP - JPEG."""
+    if RECIPE_IMAGE_FORMAT == 'WEBP' and not features.check('webp'):
+        return RECIPE_IMAGE_FALLBACK_FORMAT
+    return RECIPE_IMAGE_FORMAT
+
+
+@contextmanager
+def open_image(file, image_format):
+    """
+    Открывает картинку, поворачивает её по EXIF и переводит в режим,
+    который поддерживает формат image_format.
+    """
+    with Image.open(file) as original:
+        image = ImageOps.exif_transpose(original)
+        if image_format == 'JPEG' and image.mode != 'RGB':
+            image = image.convert('RGB')
+        elif image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA')
+        yield image
+
+
+def save_resized(image, size, file, image_format):
+    """Сохраняет в file копию картинки, уменьшенную до размера size."""
+    resized = image.copy()
+    resized.thumbnail(size, Image.LANCZOS)
+    resized.save(file, image_format, quality=RECIPE_IMAGE_QUALITY)
+
+
+def get_variant_name(name, variant, image_format):
+    directory, filename = os.path.split(name)
+    stem = os.path.splitext(filename)[0]
+    return os.path.join(
+        directory, 'variants', stem,
+        f'{variant}.{FORMAT_EXTENSIONS[image_format]}'
+    )
+
+
+def get_image_variants(recipe):
+    """
+    Имена файлов готовых вариантов картинки рецепта или пустой словарь,
+    если варианты для текущей картинки ещё не построены.
+    """
+    variants = recipe.image_variants
+    if not variants or variants.get('source') != recipe.image.name:
+        return {}
+    return {
+        variant: variants[variant]
+        for variant in RECIPE_IMAGE_VARIANTS if variant in variants
+    }
+
+
+def process_image(name, recipe_ids=None):
+    """Строит недостающие варианты картинки и записывает их рецептам."""
+    image_format = get_variants_format()
+    variants = {'source': name}
+    with default_storage.open(name) as file, open_image(
+        file, image_format
+    ) as image:
+        for variant, size in RECIPE_IMAGE_VARIANTS.items():
+            variant_name = get_variant_name(name, variant, image_format)
+            if not default_storage.exists(variant_name):
+                buffer = io.BytesIO()
+                save_resized(image, size, buffer, image_format)
+                variant_name = default_storage.save(
+                    variant_name, ContentFile(buffer.getvalue())
+                )
+            variants[variant] = variant_name
+    recipes = Recipe.objects.filter(image=name)
+    if recipe_ids is None:
+        recipe_ids = list(recipes.values_list('pk', flat=True))
+    try:
+        return recipes.update(
+            image_variants=variants, updated_at=timezone.now()
+        )
+    finally:
+        response_cache.invalidate(RECIPES_TAG, *map(recipe_tag, recipe_ids))
+
+
+class ImageWorker:
+    """
+    Очередь обработки картинок рецептов в фоновом потоке процесса:
+    варианты картинки строятся вне обработки запроса. Поток запускается
+    при первой постановке задачи в очередь.
+    """
+    def __init__(self):
+        self.queue = queue.Queue()
+        self.thread = None
+        self.lock = threading.Lock()
+
+    def start(self):
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(
+                    target=self.run, name='recipe-images', daemon=True
+                )
+                self.thread.start()
+
+    def enqueue(self, name, recipe_id):
+        # Настройка читается при вызове, чтобы её можно было переопределить
+        # в командах замеров.
+        if not settings.RECIPE_IMAGE_ASYNC:
+            process_image(name, (recipe_id,))
+            return
+        self.start()
+        self.queue.put((name, recipe_id))
+
+    def run(self):
+        while True:
+            name, recipe_id = self.queue.get()
+            try:
+                process_image(name, (recipe_id,))
+            except Exception:
+                logger.exception('Не удалось обработать картинку %s', name)
+            finally:
+                close_old_connections()
+                self.queue.task_done()
+
+
+image_worker = ImageWorker()
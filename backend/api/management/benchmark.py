@@ -0,0 +1,45 @@
+import base64
+import io
+import json
+from contextlib import contextmanager
+
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+from PIL import Image
+
+
+@contextmanager
+def test_database():
+    """
+    Временная тестовая база данных для замеров: создаётся для текущего
+    DB_ENGINE и удаляется после выхода из блока.
+    """
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(
+        verbosity=0, autoclobber=True, serialize=False
+    )
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+
+
+def write_json_report(report, path):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+def make_image():
+    """Содержимое небольшой картинки в формате PNG."""
+    image = io.BytesIO()
+    Image.new('RGB', (8, 8), color='white').save(image, format='PNG')
+    return image.getvalue()
+
+
+def make_base64_image():
+    """Картинка в формате строки base64, как её присылает фронтенд."""
+    return (
+        'data:image/png;base64,'
+        + base64.b64encode(make_image()).decode()
+    )
@@ -0,0 +1,522 @@
+import random
+import statistics
+import tempfile
+import time
+from collections import namedtuple
+
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from api.management.benchmark import (make_base64_image, make_image,
+                                      test_database, write_json_report)
+from api.management.commands.recount_counters import recount_counters
+from recipes.models import (Favorite, Ingredient, IngredientInRecipe, Recipe,
+                            ShoppingCart, ShoppingCartIngredient, Tag)
+from users.models import Follow, User
+
+Scenario = namedtuple(
+    'Scenario', ('name', 'method', 'path', 'data', 'status', 'anonymous'),
+    defaults=(False,)
+)
+
+QUERY_BUDGETS = {
+    'users_list': 8,
+    'users_detail': 2,
+    'users_me': 1,
+    'tags_list': 0,
+    'tags_detail': 0,
+    'ingredients_list': 0,
+    'ingredients_search': 0,
+    'ingredients_detail': 0,
+    'recipes_list': 4,
+    'recipes_list_filtered': 4,
+    'recipes_list_cursor': 3,
+    'recipes_list_anonymous': 4,
+    'recipes_list_anonymous_cached': 0,
+    'recipes_list_public': 4,
+    'recipes_list_public_cached': 0,
+    'recipes_flags': 1,
+    'recipes_search': 4,
+    'recipes_pantry': 4,
+    'recipes_popular': 4,
+    'recipes_list_favorited': 4,
+    'recipes_detail': 3,
+    'recipes_detail_anonymous_cached': 0,
+    'recipes_feed': 3,
+    'recipes_feed_next': 3,
+    'recipes_create': 13,
+    'recipes_update': 17,
+    'recipes_delete': 14,
+    'favorite_add': 4,
+    'favorite_remove': 7,
+    'shopping_cart_add': 12,
+    'shopping_cart_remove': 13,
+    'download_shopping_cart': 2,
+    'download_shopping_cart_csv': 2,
+    'shopping_cart_summary': 1,
+    'subscriptions': 3,
+    'subscribe': 8,
+    'unsubscribe': 7,
+}
+
+BENCHMARK_PASSWORD = 'Benchmark-password-1'
+
+
+class Command(BaseCommand):
+    help = (
+        'Замер количества SQL-запросов и времени ответа для каждого '
+        'эндпоинта API на синтетических данных во временной тестовой базе.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=2000)
+        parser.add_argument('--recipes', type=int, default=3000)
+        parser.add_argument('--ingredients', type=int, default=2000)
+        parser.add_argument('--tags', type=int, default=10)
+        parser.add_argument(
+            '--max-recipe-ingredients', type=int, default=10
+        )
+        parser.add_argument('--follows', type=int, default=5)
+        parser.add_argument('--favorites', type=int, default=10)
+        parser.add_argument('--carts', type=int, default=3)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument(
+            '--warmup',
+            type=int,
+            default=1,
+            help=(
+                'Число прогонов без замеров для прогрева кешей и индексов '
+                'в памяти процесса.'
+            )
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--output',
+            help='Путь к файлу для отчёта в формате JSON.'
+        )
+        parser.add_argument(
+            '--no-fail',
+            action='store_true',
+            help='Не завершаться с ошибкой при превышении лимитов запросов.'
+        )
+
+    def handle(self, *args, **options):
+        # Картинки обрабатываются в запросе: фоновый поток писал бы
+        # во временную базу параллельно с замерами. Замеры идут в одном
+        # процессе, поэтому кеш в его памяти общий для всех запросов.
+        with test_database(), override_settings(
+            MEDIA_ROOT=tempfile.mkdtemp(),
+            RECIPE_IMAGE_ASYNC=False,
+            SHARED_CACHE=True,
+            AUTH_TOKEN_CACHE_TTL=60
+        ):
+            report = self.run_benchmark(options)
+        self.write_report(report, options['output'])
+        failed = [
+            result['name'] for result in report['results']
+            if not result['passed']
+        ]
+        if failed and not options['no_fail']:
+            raise CommandError(
+                'Превышен лимит запросов или неверный статус ответа: '
+                + ', '.join(failed)
+            )
+
+    def run_benchmark(self, options):
+        rnd = random.Random(options['seed'])
+        started = time.perf_counter()
+        dataset = self.seed(rnd, options)
+        seeding_time = time.perf_counter() - started
+        client = APIClient()
+        client.credentials(
+            HTTP_AUTHORIZATION=f'Token {dataset["token"]}'
+        )
+        anonymous_client = APIClient()
+        state = {}
+        scenarios = self.get_scenarios(dataset)
+        timings = {scenario.name: [] for scenario in scenarios}
+        queries = {scenario.name: 0 for scenario in scenarios}
+        statuses = {scenario.name: set() for scenario in scenarios}
+        for iteration in range(options['warmup'] + options['repeat']):
+            for scenario in scenarios:
+                path = scenario.path(state)
+                data = scenario.data(state) if scenario.data else None
+                with CaptureQueriesContext(connection) as context:
+                    started = time.perf_counter()
+                    response = getattr(
+                        anonymous_client if scenario.anonymous else client,
+                        scenario.method
+                    )(
+                        path, data=data, format='json'
+                    )
+                    if response.streaming:
+                        b''.join(response.streaming_content)
+                    elapsed = time.perf_counter() - started
+                if scenario.name == 'recipes_create':
+                    state['created_recipe_id'] = response.data.get('id')
+                if scenario.name == 'recipes_feed':
+                    state['feed_next'] = response.data.get('next')
+                if iteration < options['warmup']:
+                    continue
+                timings[scenario.name].append(elapsed * 1000)
+                queries[scenario.name] = max(
+                    queries[scenario.name], len(context.captured_queries)
+                )
+                statuses[scenario.name].add(response.status_code)
+        results = []
+        for scenario in scenarios:
+            budget = QUERY_BUDGETS[scenario.name]
+            results.append({
+                'name': scenario.name,
+                'method': scenario.method.upper(),
+                'path': scenario.path(state),
+                'statuses': sorted(statuses[scenario.name]),
+                'queries': queries[scenario.name],
+                'budget': budget,
+                'passed': (
+                    queries[scenario.name] <= budget and
+                    statuses[scenario.name] == {scenario.status}
+                ),
+                'time_ms': {
+                    'min': round(min(timings[scenario.name]), 2),
+                    'median': round(
+                        statistics.median(timings[scenario.name]), 2
+                    ),
+                    'max': round(max(timings[scenario.name]), 2),
+                },
+            })
+        return {
+            'database': connection.vendor,
+            'seed': options['seed'],
+            'repeat': options['repeat'],
+            'warmup': options['warmup'],
+            'seeding_time_s': round(seeding_time, 2),
+            'dataset': dataset['sizes'],
+            'results': results,
+        }
+
+    def seed(self, rnd, options):
+        password = make_password(BENCHMARK_PASSWORD)
+        User.objects.bulk_create(
+            User(
+                username=f'user{i}',
+                email=f'user{i}@foodgram.test',
+                first_name=f'Имя{i}',
+                last_name=f'Фамилия{i}',
+                password=password
+            )
+            for i in range(options['users'])
+        )
+        user_ids = list(User.objects.values_list('id', flat=True))
+        Tag.objects.bulk_create(
+            Tag(name=f'Тег {i}', color=f'#{i:06X}', slug=f'tag{i}')
+            for i in range(options['tags'])
+        )
+        tag_ids = list(Tag.objects.values_list('id', flat=True))
+        Ingredient.objects.bulk_create(
+            Ingredient(name=f'ингредиент {i}', measurement_unit='г')
+            for i in range(options['ingredients'])
+        )
+        ingredient_ids = list(Ingredient.objects.values_list('id', flat=True))
+        image = default_storage.save(
+            'recipes/benchmark.png', ContentFile(make_image())
+        )
+        Recipe.objects.bulk_create(
+            Recipe(
+                author_id=rnd.choice(user_ids),
+                name=f'Рецепт {i}',
+                image=image,
+                text=f'Описание рецепта {i}',
+                cooking_time=rnd.randint(1, 180)
+            )
+            for i in range(options['recipes'])
+        )
+        recipe_ids = list(Recipe.objects.values_list('id', flat=True))
+        recipe_tags = []
+        recipe_ingredients = []
+        for recipe_id in recipe_ids:
+            for tag_id in rnd.sample(tag_ids, rnd.randint(1, 3)):
+                recipe_tags.append(Recipe.tags.through(
+                    recipe_id=recipe_id, tag_id=tag_id
+                ))
+            for ingredient_id in rnd.sample(
+                ingredient_ids,
+                rnd.randint(1, options['max_recipe_ingredients'])
+            ):
+                recipe_ingredients.append(IngredientInRecipe(
+                    recipe_id=recipe_id,
+                    ingredient_id=ingredient_id,
+                    amount=rnd.randint(1, 500)
+                ))
+        Recipe.tags.through.objects.bulk_create(recipe_tags, batch_size=5000)
+        IngredientInRecipe.objects.bulk_create(
+            recipe_ingredients, batch_size=5000
+        )
+        follows, favorites, carts = [], [], []
+        for user_id in user_ids:
+            for followee_id in set(rnd.sample(user_ids, options['follows'])):
+                if followee_id != user_id:
+                    follows.append(
+                        Follow(follower_id=user_id, followee_id=followee_id)
+                    )
+            for recipe_id in rnd.sample(recipe_ids, options['favorites']):
+                favorites.append(
+                    Favorite(user_id=user_id, recipe_id=recipe_id)
+                )
+            for recipe_id in rnd.sample(recipe_ids, options['carts']):
+                carts.append(
+                    ShoppingCart(user_id=user_id, recipe_id=recipe_id)
+                )
+        Follow.objects.bulk_create(follows, batch_size=5000)
+        Favorite.objects.bulk_create(favorites, batch_size=5000)
+        ShoppingCart.objects.bulk_create(carts, batch_size=5000)
+        ShoppingCartIngredient.objects.rebuild(batch_size=5000)
+        recount_counters()
+        user = User.objects.get(id=user_ids[0])
+        followed = set(user.follows.values_list('followee_id', flat=True))
+        own_recipe_id = Recipe.objects.create(
+            author=user,
+            name='Рецепт для замеров',
+            image=image,
+            text='Описание',
+            cooking_time=10
+        ).id
+        marked = set(user.favorites.values_list('recipe_id', flat=True))
+        marked |= set(user.shops_for.values_list('recipe_id', flat=True))
+        return {
+            'token': Token.objects.create(user=user).key,
+            'user_id': user.id,
+            'followee_id': next(
+                user_id for user_id in user_ids[1:]
+                if user_id not in followed
+            ),
+            'recipe_id': own_recipe_id,
+            'other_recipe_id': next(
+                recipe_id for recipe_id in recipe_ids
+                if recipe_id not in marked
+            ),
+            'tag_slugs': list(
+                Tag.objects.values_list('slug', flat=True)[:2]
+            ),
+            'ingredient_ids': ingredient_ids,
+            'tag_ids': tag_ids,
+            'sizes': {
+                'users': len(user_ids),
+                'tags': len(tag_ids),
+                'ingredients': len(ingredient_ids),
+                'recipes': len(recipe_ids) + 1,
+                'recipe_ingredients': len(recipe_ingredients),
+                'follows': len(follows),
+                'favorites': len(favorites),
+                'shopping_carts': len(carts),
+            },
+        }
+
+    def get_scenarios(self, dataset):
+        image = make_base64_image()
+
+        def recipe_data(count):
+            return lambda state: {
+                'name': 'Рецепт из замеров',
+                'text': 'Описание',
+                'cooking_time': 15,
+                'image': image,
+                'tags': dataset['tag_ids'][:2],
+                'ingredients': [
+                    {'id': ingredient_id, 'amount': 10}
+                    for ingredient_id in dataset['ingredient_ids'][:count]
+                ],
+            }
+
+        def path(template):
+            return lambda state: template.format(**dataset, **state)
+
+        tags = '&'.join(f'tags={slug}' for slug in dataset['tag_slugs'])
+        return (
+            Scenario('users_list', 'get', path('/api/users/'), None, 200),
+            Scenario(
+                'users_detail', 'get', path('/api/users/{followee_id}/'),
+                None, 200
+            ),
+            Scenario('users_me', 'get', path('/api/users/me/'), None, 200),
+            Scenario('tags_list', 'get', path('/api/tags/'), None, 200),
+            Scenario(
+                'tags_detail', 'get',
+                lambda state: f'/api/tags/{dataset["tag_ids"][0]}/',
+                None, 200
+            ),
+            Scenario(
+                'ingredients_list', 'get', path('/api/ingredients/'),
+                None, 200
+            ),
+            Scenario(
+                'ingredients_search', 'get',
+                path('/api/ingredients/?name=ингредиент 1'), None, 200
+            ),
+            Scenario(
+                'ingredients_detail', 'get',
+                lambda state: (
+                    f'/api/ingredients/{dataset["ingredient_ids"][0]}/'
+                ),
+                None, 200
+            ),
+            Scenario('recipes_list', 'get', path('/api/recipes/'), None, 200),
+            Scenario(
+                'recipes_list_filtered', 'get',
+                lambda state: f'/api/recipes/?{tags}&limit=24', None, 200
+            ),
+            Scenario(
+                'recipes_list_cursor', 'get',
+                lambda state: (
+                    f'/api/recipes/?{tags}&limit=24&pagination=cursor'
+                ),
+                None, 200
+            ),
+            Scenario(
+                'recipes_list_anonymous', 'get',
+                lambda state: f'/api/recipes/?{tags}&limit=24', None, 200,
+                True
+            ),
+            Scenario(
+                'recipes_list_anonymous_cached', 'get',
+                lambda state: f'/api/recipes/?limit=24&{tags}', None, 200,
+                True
+            ),
+            Scenario(
+                'recipes_list_public', 'get',
+                lambda state: f'/api/recipes/?{tags}&limit=24&public=1',
+                None, 200
+            ),
+            Scenario(
+                'recipes_list_public_cached', 'get',
+                lambda state: f'/api/recipes/?{tags}&limit=24&public=1',
+                None, 200, True
+            ),
+            Scenario(
+                'recipes_flags', 'get',
+                path(
+                    '/api/recipes/flags/?ids={recipe_id}&ids={other_recipe_id}'
+                ),
+                None, 200
+            ),
+            Scenario(
+                'recipes_search', 'get',
+                path('/api/recipes/?search=рецепт 12'), None, 200
+            ),
+            Scenario(
+                'recipes_pantry', 'get',
+                lambda state: '/api/recipes/pantry/?' + '&'.join(
+                    f'ingredients={ingredient_id}'
+                    for ingredient_id in dataset['ingredient_ids'][:30]
+                ),
+                None, 200
+            ),
+            Scenario(
+                'recipes_popular', 'get',
+                path('/api/recipes/?ordering=popular&limit=24'), None, 200
+            ),
+            Scenario(
+                'recipes_list_favorited', 'get',
+                path('/api/recipes/?is_favorited=1'), None, 200
+            ),
+            Scenario(
+                'recipes_detail', 'get', path('/api/recipes/{recipe_id}/'),
+                None, 200
+            ),
+            Scenario(
+                'recipes_detail_anonymous_cached', 'get',
+                path('/api/recipes/{other_recipe_id}/'), None, 200, True
+            ),
+            Scenario(
+                'recipes_feed', 'get', path('/api/recipes/feed/?limit=2'),
+                None, 200
+            ),
+            Scenario(
+                'recipes_feed_next', 'get',
+                lambda state: state['feed_next'] or '/api/recipes/feed/',
+                None, 200
+            ),
+            Scenario(
+                'recipes_create', 'post', path('/api/recipes/'),
+                recipe_data(25), 201
+            ),
+            Scenario(
+                'recipes_update', 'patch',
+                lambda state: f'/api/recipes/{state["created_recipe_id"]}/',
+                recipe_data(20), 200
+            ),
+            Scenario(
+                'recipes_delete', 'delete',
+                lambda state: f'/api/recipes/{state["created_recipe_id"]}/',
+                None, 204
+            ),
+            Scenario(
+                'favorite_add', 'post',
+                path('/api/recipes/{other_recipe_id}/favorite/'), None, 201
+            ),
+            Scenario(
+                'favorite_remove', 'delete',
+                path('/api/recipes/{other_recipe_id}/favorite/'), None, 204
+            ),
+            Scenario(
+                'shopping_cart_add', 'post',
+                path('/api/recipes/{other_recipe_id}/shopping_cart/'),
+                None, 201
+            ),
+            Scenario(
+                'shopping_cart_remove', 'delete',
+                path('/api/recipes/{other_recipe_id}/shopping_cart/'),
+                None, 204
+            ),
+            Scenario(
+                'download_shopping_cart', 'get',
+                path('/api/recipes/download_shopping_cart/'), None, 200
+            ),
+            Scenario(
+                'download_shopping_cart_csv', 'get',
+                path('/api/recipes/download_shopping_cart/?file_format=csv'),
+                None, 200
+            ),
+            Scenario(
+                'shopping_cart_summary', 'get',
+                path('/api/recipes/shopping_cart_summary/'), None, 200
+            ),
+            Scenario(
+                'subscriptions', 'get',
+                path('/api/users/subscriptions/?recipes_limit=3'), None, 200
+            ),
+            Scenario(
+                'subscribe', 'post',
+                path('/api/users/{followee_id}/subscribe/'), None, 201
+            ),
+            Scenario(
+                'unsubscribe', 'delete',
+                path('/api/users/{followee_id}/subscribe/'), None, 204
+            ),
+        )
+
+    def write_report(self, report, output):
+        self.stdout.write(
+            f'База данных: {report["database"]}, '
+            f'наполнение: {report["seeding_time_s"]} с, '
+            f'данные: {report["dataset"]}'
+        )
+        for result in report['results']:
+            line = (
+                f'{result["name"]:<28} {result["method"]:<7}'
+                f'запросов {result["queries"]:>3}/{result["budget"]:<3} '
+                f'медиана {result["time_ms"]["median"]:>9} мс '
+                f'статус {",".join(map(str, result["statuses"]))}'
+            )
+            style = self.style.SUCCESS if result['passed'] else (
+                self.style.ERROR
+            )
+            self.stdout.write(style(line))
+        if output:
+            write_json_report(report, output)
@@ -0,0 +1,128 @@
+import json
+import random
+import statistics
+import time
+
+from django.core.management import BaseCommand
+from django.db import connection
+
+from api.autocomplete import ingredient_index, search_in_database
+from api.management.benchmark import test_database, write_json_report
+from foodgram.settings import BASE_DIR, INGREDIENT_SEARCH_LIMIT
+from recipes.models import Ingredient
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнение скорости подсказок ингредиентов: запрос к базе данных '
+        '(триграммный индекс в PostgreSQL) против индекса в памяти процесса.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--source',
+            default=str(BASE_DIR.parent / 'data' / 'ingredients.json'),
+            help='JSON-файл с ингредиентами для наполнения тестовой базы.'
+        )
+        parser.add_argument(
+            '--copies',
+            type=int,
+            default=1,
+            help='Сколько раз размножить список ингредиентов.'
+        )
+        parser.add_argument('--queries', type=int, default=300)
+        parser.add_argument(
+            '--limit', type=int, default=INGREDIENT_SEARCH_LIMIT
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--output',
+            help='Путь к файлу для отчёта в формате JSON.'
+        )
+
+    def handle(self, *args, **options):
+        with test_database():
+            report = self.run_benchmark(options)
+        for method, result in report['methods'].items():
+            self.stdout.write(
+                f'{method:<10} среднее {result["mean_ms"]:>8} мс, '
+                f'p95 {result["p95_ms"]:>8} мс'
+            )
+        self.stdout.write(
+            f'Ингредиентов: {report["ingredients"]}, '
+            f'построение индекса: {report["index_build_ms"]} мс, '
+            f'совпадение выдачи: {report["agreement"]:.0%}'
+        )
+        if options['output']:
+            write_json_report(report, options['output'])
+
+    def run_benchmark(self, options):
+        rnd = random.Random(options['seed'])
+        with open(options['source'], encoding='utf-8') as f:
+            data = json.load(f)
+        Ingredient.objects.bulk_create(
+            (
+                Ingredient(
+                    name=(
+                        item['name'] if copy == 0
+                        else f'{item["name"]} {copy}'
+                    ),
+                    measurement_unit=item['measurement_unit']
+                )
+                for copy in range(options['copies'])
+                for item in data
+            ),
+            batch_size=5000,
+            ignore_conflicts=True
+        )
+        names = list(Ingredient.objects.values_list('name', flat=True))
+        values = []
+        for name in rnd.sample(names, min(options['queries'], len(names))):
+            start = rnd.randint(0, max(len(name) - 3, 0))
+            length = rnd.randint(1, 4)
+            values.append(
+                name[:length] if rnd.random() < 0.7
+                else name[start:start + length]
+            )
+        started = time.perf_counter()
+        ingredient_index.get_entries()
+        index_build_ms = (time.perf_counter() - started) * 1000
+        queryset = Ingredient.objects.all()
+        methods = {
+            'database': lambda value: [
+                ingredient.id for ingredient in search_in_database(
+                    queryset, value, options['limit']
+                )
+            ],
+            'index': lambda value: sum(
+                ingredient_index.search(value, options['limit']), []
+            ),
+        }
+        timings = {method: [] for method in methods}
+        results = {method: [] for method in methods}
+        for value in values:
+            for method, search in methods.items():
+                started = time.perf_counter()
+                results[method].append(search(value))
+                timings[method].append((time.perf_counter() - started) * 1000)
+        agreement = sum(
+            database == index
+            for database, index in zip(results['database'], results['index'])
+        ) / len(values)
+        return {
+            'database': connection.vendor,
+            'ingredients': len(names),
+            'queries': len(values),
+            'limit': options['limit'],
+            'index_build_ms': round(index_build_ms, 2),
+            'agreement': agreement,
+            'methods': {
+                method: {
+                    'mean_ms': round(statistics.mean(timings[method]), 3),
+                    'p95_ms': round(
+                        statistics.quantiles(timings[method], n=20)[-1], 3
+                    ),
+                }
+                for method in methods
+            },
+        }
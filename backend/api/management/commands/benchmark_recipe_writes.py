@@ -0,0 +1,156 @@
+import tempfile
+
+from django.core.management import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from api.catalog import tag_catalog
+from api.management.benchmark import (make_base64_image, test_database,
+                                      write_json_report)
+from recipes.models import Ingredient, Tag
+from users.models import User
+
+WRITE_STATEMENTS = ('INSERT', 'UPDATE', 'DELETE')
+
+
+class Command(BaseCommand):
+    help = (
+        'Замер количества SQL-запросов при создании и изменении рецепта '
+        'в зависимости от числа ингредиентов в нём.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--counts',
+            default='2,5,10,25,50',
+            help='Числа ингредиентов в рецепте через запятую.'
+        )
+        parser.add_argument(
+            '--output',
+            help='Путь к файлу для отчёта в формате JSON.'
+        )
+
+    def handle(self, *args, **options):
+        counts = [int(count) for count in options['counts'].split(',')]
+        # Картинки обрабатываются в запросе: фоновый поток писал бы
+        # во временную базу параллельно с замерами. Замеры идут в одном
+        # процессе, поэтому кеш в его памяти общий для всех запросов.
+        with test_database(), override_settings(
+            MEDIA_ROOT=tempfile.mkdtemp(),
+            RECIPE_IMAGE_ASYNC=False,
+            SHARED_CACHE=True,
+            AUTH_TOKEN_CACHE_TTL=60
+        ):
+            results = self.run_benchmark(counts)
+        for result in results:
+            self.stdout.write(
+                f'{result["action"]:<7} '
+                f'ингредиентов {result["ingredients"]:>4}: '
+                f'запросов {result["queries"]:>3}, '
+                f'из них на запись {result["write_queries"]:>3}'
+            )
+        if options['output']:
+            write_json_report(
+                {'database': connection.vendor, 'results': results},
+                options['output']
+            )
+        for action in ('create', 'update'):
+            for key, title in (
+                ('queries', 'запросов'),
+                ('write_queries', 'запросов на запись')
+            ):
+                values = {
+                    result[key] for result in results
+                    if result['action'] == action
+                }
+                if len(values) > 1:
+                    raise CommandError(
+                        f'Число {title} при {action} зависит от '
+                        f'количества ингредиентов: {sorted(values)}.'
+                    )
+
+    def run_benchmark(self, counts):
+        user = User.objects.create_user(
+            username='benchmark',
+            email='benchmark@foodgram.test',
+            first_name='Имя',
+            last_name='Фамилия',
+            password='Benchmark-password-1'
+        )
+        tag_ids = [
+            Tag.objects.create(
+                name=f'Тег {i}', color=f'#{i:06X}', slug=f'tag{i}'
+            ).id
+            for i in range(3)
+        ]
+        # Справочник тегов загружается заранее, чтобы его чтение
+        # не попало в замер первого запроса.
+        tag_catalog.get_items()
+        Ingredient.objects.bulk_create(
+            Ingredient(name=f'ингредиент {i}', measurement_unit='г')
+            for i in range(2 * max(counts))
+        )
+        ingredient_ids = list(Ingredient.objects.values_list('id', flat=True))
+        client = APIClient()
+        client.credentials(
+            HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=user).key}'
+        )
+        # Пользователь по токену кешируется заранее, чтобы его чтение
+        # не попало в замер первого запроса.
+        client.get('/api/users/me/')
+        image = make_base64_image()
+        results = []
+        for count in counts:
+            data = {
+                'name': 'Рецепт',
+                'text': 'Описание',
+                'cooking_time': 15,
+                'image': image,
+                'tags': tag_ids[:2],
+                'ingredients': [
+                    {'id': ingredient_id, 'amount': 10}
+                    for ingredient_id in ingredient_ids[:count]
+                ],
+            }
+            response, create_queries = self.measure(
+                client.post, '/api/recipes/', data, 201
+            )
+            kept = count // 2
+            data['tags'] = tag_ids[1:]
+            data['ingredients'] = [
+                {'id': ingredient_id, 'amount': 20}
+                for ingredient_id in ingredient_ids[:kept]
+            ] + [
+                {'id': ingredient_id, 'amount': 10}
+                for ingredient_id in ingredient_ids[count:count + kept]
+            ]
+            _, update_queries = self.measure(
+                client.patch, f'/api/recipes/{response.data["id"]}/',
+                data, 200
+            )
+            for action, queries in (
+                ('create', create_queries), ('update', update_queries)
+            ):
+                results.append({
+                    'action': action,
+                    'ingredients': count,
+                    'queries': len(queries),
+                    'write_queries': sum(
+                        query['sql'].lstrip().upper().startswith(
+                            WRITE_STATEMENTS
+                        )
+                        for query in queries
+                    ),
+                })
+        return results
+
+    def measure(self, method, path, data, status):
+        with CaptureQueriesContext(connection) as context:
+            response = method(path, data=data, format='json')
+        if response.status_code != status:
+            raise CommandError(
+                f'{path}: статус {response.status_code}, {response.data}'
+            )
+        return response, context.captured_queries
@@ -0,0 +1,128 @@
+import random
+import statistics
+import time
+
+from django.core.management import BaseCommand
+from django.db import connection
+
+from api.management.benchmark import test_database, write_json_report
+from recipes.models import Recipe, Tag
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнение фильтрации рецептов по тегам: соединение с таблицей '
+        'тегов против подзапросов к промежуточной таблице тегов рецепта '
+        '(любой из тегов и все теги).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=100000)
+        parser.add_argument('--tags', type=int, default=10)
+        parser.add_argument('--max-recipe-tags', type=int, default=3)
+        parser.add_argument('--page-size', type=int, default=24)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--output',
+            help='Путь к файлу для отчёта в формате JSON.'
+        )
+
+    def handle(self, *args, **options):
+        with test_database():
+            report = self.run_benchmark(options)
+        for result in report['results']:
+            self.stdout.write(
+                f'{result["method"]:<9} тегов {result["tags"]}: '
+                f'рецептов {result["count"]:>7} '
+                f'(строк {result["rows"]:>7}), '
+                f'медиана {result["median_ms"]:>9} мс'
+            )
+        if options['output']:
+            write_json_report(report, options['output'])
+
+    def seed(self, rnd, options):
+        author = User.objects.create_user(
+            username='benchmark',
+            email='benchmark@foodgram.test',
+            first_name='Имя',
+            last_name='Фамилия'
+        )
+        Tag.objects.bulk_create(
+            Tag(name=f'Тег {i}', color=f'#{i:06X}', slug=f'tag{i}')
+            for i in range(options['tags'])
+        )
+        tag_ids = list(Tag.objects.values_list('id', flat=True))
+        Recipe.objects.bulk_create(
+            (
+                Recipe(
+                    author=author,
+                    name=f'Рецепт {i}',
+                    image='recipes/benchmark.png',
+                    text='Описание',
+                    cooking_time=10
+                )
+                for i in range(options['recipes'])
+            ),
+            batch_size=5000
+        )
+        recipe_tags = Recipe.tags.through
+        recipe_tags.objects.bulk_create(
+            (
+                recipe_tags(recipe_id=recipe_id, tag_id=tag_id)
+                for recipe_id in Recipe.objects.values_list('id', flat=True)
+                for tag_id in rnd.sample(
+                    tag_ids, rnd.randint(1, options['max_recipe_tags'])
+                )
+            ),
+            batch_size=5000
+        )
+        return tag_ids
+
+    def run_benchmark(self, options):
+        rnd = random.Random(options['seed'])
+        tag_ids = self.seed(rnd, options)
+        slugs = dict(Tag.objects.values_list('id', 'slug'))
+        methods = {
+            'join': lambda ids: Recipe.objects.filter(
+                tags__slug__in=[slugs[tag_id] for tag_id in ids]
+            ),
+            'join_dist': lambda ids: Recipe.objects.filter(
+                tags__slug__in=[slugs[tag_id] for tag_id in ids]
+            ).distinct(),
+            'any': lambda ids: Recipe.objects.with_tags(ids),
+            'all': lambda ids: Recipe.objects.with_tags(
+                ids, match_all=True
+            ),
+        }
+        page_size = options['page_size']
+        results = []
+        for count in (1, 2, 3):
+            ids = tag_ids[:count]
+            for method, get_queryset in methods.items():
+                timings = []
+                for _ in range(options['repeat']):
+                    started = time.perf_counter()
+                    queryset = get_queryset(ids)
+                    rows = queryset.count()
+                    # Первая и одна из дальних страниц, как в списке
+                    # рецептов API.
+                    for offset in (0, 100 * page_size):
+                        list(queryset.order_by('-pub_date').values_list(
+                            'id', flat=True
+                        )[offset:offset + page_size])
+                    timings.append((time.perf_counter() - started) * 1000)
+                results.append({
+                    'method': method,
+                    'tags': count,
+                    'rows': rows,
+                    'count': get_queryset(ids).distinct().count(),
+                    'median_ms': round(statistics.median(timings), 2),
+                })
+        return {
+            'database': connection.vendor,
+            'recipes': options['recipes'],
+            'tags': options['tags'],
+            'results': results,
+        }
@@ -0,0 +1,31 @@
+from django.core.management import BaseCommand
+
+from api.images import get_image_variants, process_image
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = (
+        'Построение вариантов картинок для рецептов, у которых они '
+        'отсутствуют, например, загруженных до появления обработки картинок.'
+    )
+
+    def handle(self, *args, **options):
+        names = {
+            recipe.image.name
+            for recipe in Recipe.objects.only(
+                'image', 'image_variants'
+            ).iterator()
+            if recipe.image and not get_image_variants(recipe)
+        }
+        updated = failed = 0
+        for name in sorted(names):
+            try:
+                updated += process_image(name)
+            except Exception as error:
+                failed += 1
+                self.stderr.write(f'{name}: {error}')
+        self.stdout.write(
+            f'Картинок обработано: {len(names) - failed}, с ошибками: '
+            f'{failed}, рецептов обновлено: {updated}.'
+        )
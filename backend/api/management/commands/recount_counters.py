@@ -0,0 +1,59 @@
+from django.contrib.auth import get_user_model
+from django.core.management import BaseCommand
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from recipes.models import Favorite, IngredientInRecipe, Recipe, ShoppingCart
+from users.models import Follow
+
+User = get_user_model()
+
+COUNTERS = (
+    (Recipe, 'favorites_count', Favorite, 'recipe'),
+    (Recipe, 'shopping_carts_count', ShoppingCart, 'recipe'),
+    (Recipe, 'ingredients_count', IngredientInRecipe, 'recipe'),
+    (User, 'followers_count', Follow, 'followee'),
+    (User, 'recipes_count', Recipe, 'author'),
+)
+
+
+def count_related(model, field):
+    """Число записей model, ссылающихся полем field на текущую запись."""
+    return Coalesce(
+        Subquery(
+            model.objects.filter(
+                **{field: OuterRef('pk')}
+            ).order_by().values(field).annotate(
+                count=Count('pk')
+            ).values('count')
+        ),
+        0
+    )
+
+
+def recount_counters():
+    """
+    Сверяет сохранённые счётчики рецептов и пользователей с числом
+    связанных записей и исправляет расхождения, например, после массовой
+    загрузки данных в обход сигналов. Возвращает число исправленных
+    записей по каждому счётчику.
+    """
+    fixed = {}
+    for model, counter, related_model, field in COUNTERS:
+        actual = count_related(related_model, field)
+        fixed[f'{model._meta.model_name}.{counter}'] = model.objects.exclude(
+            **{counter: actual}
+        ).update(**{counter: actual})
+    return fixed
+
+
+class Command(BaseCommand):
+    help = (
+        'Сверка счётчиков рецептов (избранное, корзины, ингредиенты) и '
+        'пользователей (подписчики, рецепты) с данными и исправление '
+        'расхождений.'
+    )
+
+    def handle(self, *args, **options):
+        for counter, fixed in recount_counters().items():
+            self.stdout.write(f'{counter}: исправлено записей {fixed}')
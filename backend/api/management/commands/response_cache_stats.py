@@ -0,0 +1,28 @@
+from django.core.management import BaseCommand
+
+from api.response_cache import response_cache
+
+
+class Command(BaseCommand):
+    help = (
+        'Число попаданий и промахов кеша ответов для анонимных '
+        'пользователей.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--reset',
+            action='store_true',
+            help='Обнулить счётчики после вывода.'
+        )
+
+    def handle(self, *args, **options):
+        stats = response_cache.get_stats()
+        total = stats['hits'] + stats['misses']
+        ratio = stats['hits'] / total * 100 if total else 0
+        self.stdout.write(
+            f'Попаданий {stats["hits"]}, промахов {stats["misses"]}, '
+            f'доля попаданий {ratio:.1f}%'
+        )
+        if options['reset']:
+            response_cache.reset_stats()
@@ -1,5 +1,138 @@
-from rest_framework.pagination import PageNumberPagination
+import base64
+import binascii
+import json
+
+from django.db import connections
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+from foodgram.settings import REST_FRAMEWORK
 
 
 class CustomPagination(PageNumberPagination):
     page_size_query_param = 'limit'
+
+
+def estimate_count(queryset):
+    """
+    Примерное число записей в выборке по оценке планировщика PostgreSQL,
+    без выполнения COUNT(*). В остальных базах данных оценки нет,
+    и число записей считается точно.
+    """
+    if connections[queryset.db].vendor != 'postgresql':
+        return queryset.count()
+    plan = json.loads(queryset.order_by().explain(format='json'))
+    return plan[0]['Plan']['Plan Rows']
+
+
+class KeysetPagination(BasePagination):
+    """Пагинация по составному ключу ordering без OFFSET."""
+    page_size = REST_FRAMEWORK['PAGE_SIZE']
+    page_size_query_param = 'limit'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+    count_functions = {
+        'exact': lambda queryset: queryset.count(),
+        'approximate': estimate_count,
+    }
+    ordering = ('pub_date', 'pk')
+    date_field = 'pub_date'
+    invalid_cursor_message = 'Некорректный курсор.'
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def encode_cursor(self, item):
+        value = '|'.join(
+            getattr(item, field).isoformat() if field == self.date_field
+            else str(getattr(item, field))
+            for field in self.ordering
+        )
+        return base64.urlsafe_b64encode(value.encode()).decode()
+
+    def decode_cursor(self, request):
+        cursor = request.query_params.get(self.cursor_query_param)
+        if not cursor:
+            return None
+        try:
+            value = base64.urlsafe_b64decode(cursor.encode()).decode()
+            values = value.split('|')
+            if len(values) != len(self.ordering):
+                raise ValueError(value)
+            values = [
+                parse_datetime(value) if field == self.date_field
+                else int(value)
+                for field, value in zip(self.ordering, values)
+            ]
+        except (binascii.Error, UnicodeDecodeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if None in values:
+            raise NotFound(self.invalid_cursor_message)
+        return values
+
+    def filter_after(self, queryset, values):
+        """Записи после записи со значениями ключа values."""
+        # Первое условие задаёт начало диапазона в индексе,
+        # второе отсекает уже показанные записи с теми же значениями
+        # первых полей ключа.
+        after = Q()
+        for index, field in enumerate(self.ordering):
+            after |= Q(
+                **dict(zip(self.ordering[:index], values[:index])),
+                **{f'{field}__lt': values[index]}
+            )
+        return queryset.filter(
+            **{f'{self.ordering[0]}__lte': values[0]}
+        ).filter(after)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        page_size = self.get_page_size(request)
+        count = self.count_functions.get(
+            request.query_params.get(self.count_query_param)
+        )
+        self.count = count(queryset) if count else None
+        queryset = queryset.order_by(
+            *(f'-{field}' for field in self.ordering)
+        )
+        cursor = self.decode_cursor(request)
+        if cursor is not None:
+            queryset = self.filter_after(queryset, cursor)
+        page = list(queryset[:page_size + 1])
+        self.has_next = len(page) > page_size
+        self.page = page[:page_size]
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return replace_query_param(
+            self.request.build_absolute_uri(),
+            self.cursor_query_param,
+            self.encode_cursor(self.page[-1])
+        )
+
+    def get_paginated_response(self, data):
+        response = {'next': self.get_next_link(), 'results': data}
+        if self.count is not None:
+            response = {'count': self.count, **response}
+        return Response(response)
+
+
+class PopularKeysetPagination(KeysetPagination):
+    """
+    Пагинация популярных рецептов по ключу (favorites_count, pub_date, id)
+    в порядке убывания, по индексу recipes_popular_idx.
+    """
+    ordering = ('favorites_count', 'pub_date', 'pk')
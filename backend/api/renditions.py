@@ -0,0 +1,118 @@
+import hashlib
+import os
+import tempfile
+import threading
+import time
+
+from django.core.files.storage import default_storage
+
+from api.images import (FORMAT_EXTENSIONS, get_variants_format, open_image,
+                        save_resized)
+from foodgram.settings import (RECIPE_IMAGE_RENDITIONS,
+                               RECIPE_IMAGE_RENDITIONS_DIR,
+                               RECIPE_IMAGE_RENDITIONS_MAX_SIZE,
+                               RECIPE_IMAGE_RENDITIONS_TOUCH_INTERVAL)
+
+
+class RenditionCache:
+    """Уменьшенные копии картинок на диске с ограничением общего размера."""
+    def __init__(self, directory=RECIPE_IMAGE_RENDITIONS_DIR,
+                 sizes=RECIPE_IMAGE_RENDITIONS,
+                 max_size=RECIPE_IMAGE_RENDITIONS_MAX_SIZE,
+                 touch_interval=RECIPE_IMAGE_RENDITIONS_TOUCH_INTERVAL):
+        self.directory = directory
+        self.sizes = sizes
+        self.max_size = max_size
+        self.touch_interval = touch_interval
+        self.total_size = None
+        self.lock = threading.Lock()
+
+    def get_root(self):
+        return default_storage.path(self.directory)
+
+    def get_name(self, source, size):
+        stem = hashlib.sha1(source.encode()).hexdigest()
+        extension = FORMAT_EXTENSIONS[get_variants_format()]
+        return f'{self.directory}/{size}/{stem}.{extension}'
+
+    def get(self, source, size):
+        """
+        Имя в хранилище копии картинки source (тоже имени файла
+        в хранилище) указанного размера; копия строится, если её ещё нет.
+        """
+        name = self.get_name(source, size)
+        path = default_storage.path(name)
+        try:
+            modified = os.stat(path).st_mtime
+        except FileNotFoundError:
+            self.render(source, size, path)
+        else:
+            now = time.time()
+            if now - modified > self.touch_interval:
+                os.utime(path, (now, now))
+        return name
+
+    def render(self, source, size, path):
+        image_format = get_variants_format()
+        with open_image(default_storage.path(source), image_format) as image:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Временный файл с уникальным именем в той же папке: копию
+            # могут одновременно строить несколько потоков и процессов.
+            descriptor, temporary_path = tempfile.mkstemp(
+                suffix='.tmp', dir=os.path.dirname(path)
+            )
+            try:
+                with os.fdopen(descriptor, 'wb') as file:
+                    save_resized(
+                        image, self.sizes[size], file, image_format
+                    )
+                os.chmod(
+                    temporary_path,
+                    default_storage.file_permissions_mode or 0o644
+                )
+                os.replace(temporary_path, path)
+            except BaseException:
+                os.remove(temporary_path)
+                raise
+        self.add(os.path.getsize(path))
+
+    def add(self, size):
+        with self.lock:
+            if self.total_size is None:
+                self.total_size = self.scan()[1]
+            else:
+                self.total_size += size
+            if self.total_size > self.max_size:
+                self.evict()
+
+    def scan(self):
+        files = []
+        for root, _, names in os.walk(self.get_root()):
+            for name in names:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, path))
+        return files, sum(size for _, size, _ in files)
+
+    def evict(self):
+        """
+        Удаляет давно не запрошенные копии, пока общий размер не станет
+        меньше 90% лимита. Размер пересчитывается по диску, так как копии
+        могут создавать и удалять другие процессы.
+        """
+        files, total_size = self.scan()
+        for _, size, path in sorted(files):
+            if total_size <= self.max_size * 0.9:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total_size -= size
+        self.total_size = total_size
+
+
+rendition_cache = RenditionCache()
@@ -0,0 +1,126 @@
+import hashlib
+import time
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from api.cache_stats import CacheStatsMixin
+from foodgram.settings import RECIPE_PAGINATION_HEADER, RESPONSE_CACHE_TTL
+
+RECIPES_TAG = 'recipes'
+
+USERS_TAG = 'users'
+
+POPULARITY_TAG = 'popularity'
+
+
+def recipe_tag(pk):
+    return f'recipe:{pk}'
+
+
+def user_tag(pk):
+    return f'user:{pk}'
+
+
+def tag_tag(pk):
+    return f'tag:{pk}'
+
+
+def ingredient_tag(pk):
+    return f'ingredient:{pk}'
+
+
+def personal_tag(pk):
+    """Тег избранного, корзины и подписок пользователя."""
+    return f'personal:{pk}'
+
+
+def get_dependencies(data):
+    """Теги зависимостей ответа с рецептами."""
+    recipes = data.get('results', ()) if 'results' in data else (data,)
+    dependencies = set()
+    for recipe in recipes:
+        dependencies.add(recipe_tag(recipe['id']))
+        dependencies.add(user_tag(recipe['author']['id']))
+        dependencies.update(tag_tag(tag['id']) for tag in recipe['tags'])
+        dependencies.update(
+            ingredient_tag(ingredient['id'])
+            for ingredient in recipe['ingredients']
+        )
+    return dependencies
+
+
+class ResponseCache(CacheStatsMixin):
+    """Кеш общих ответов API, которые сбрасываются по версиям тегов."""
+    prefix = 'response'
+
+    def __init__(self, ttl=RESPONSE_CACHE_TTL):
+        self.ttl = ttl
+
+    def get_key(self, request):
+        """Ключ по адресу, хосту и параметрам запроса без учёта их порядка."""
+        params = request.query_params
+        query = '&'.join(
+            f'{name}={value}'
+            for name in sorted(params)
+            for value in sorted(params.getlist(name))
+        )
+        digest = hashlib.md5('|'.join((
+            request.build_absolute_uri(request.path),
+            query,
+            request.accepted_renderer.format,
+            request.headers.get(RECIPE_PAGINATION_HEADER, ''),
+        )).encode()).hexdigest()
+        return f'{self.prefix}:entry:{digest}'
+
+    def get_version_key(self, tag):
+        return f'{self.prefix}:version:{tag}'
+
+    def get_versions(self, tags):
+        """Текущие версии тегов; тегу без версии присваивается новая."""
+        keys = {self.get_version_key(tag): tag for tag in tags}
+        versions = cache.get_many(keys)
+        missing = keys.keys() - versions.keys()
+        if missing:
+            now = time.time_ns()
+            for key in missing:
+                cache.add(key, now, timeout=None)
+            versions.update(cache.get_many(missing))
+        return {tag: versions[key] for key, tag in keys.items()}
+
+    def get(self, key):
+        entry = cache.get(key)
+        if entry is not None:
+            data, versions = entry
+            if self.get_versions(versions) == versions:
+                self.count('hits')
+                return data
+        self.count('misses')
+        return None
+
+    def set(self, key, data, dependencies):
+        versions = self.get_versions(dependencies)
+        cache.set(key, (data, versions), timeout=self.ttl)
+
+    def invalidate(self, *tags):
+        cache.set_many(
+            {self.get_version_key(tag): time.time_ns() for tag in tags},
+            timeout=None
+        )
+
+    def invalidate_on_commit(self, *tags):
+        """Сбрасывает ответы с тегами tags после коммита транзакции."""
+        transaction.on_commit(partial(self.invalidate, *tags))
+
+
+response_cache = ResponseCache()
+
+
+def is_cacheable(request):
+    """Кеш ответов работает только с общим кешем Django."""
+    return (
+        settings.RESPONSE_CACHE_ENABLED and settings.SHARED_CACHE and
+        request.method == 'GET'
+    )
@@ -1,22 +1,25 @@
-import base64
-import uuid
-
 from django.contrib.auth import get_user_model
-from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
 from django.db import transaction
 from django.shortcuts import get_object_or_404
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.exceptions import ValidationError
 from rest_framework.serializers import (CurrentUserDefault, HiddenField,
-                                        ImageField, ModelSerializer,
+                                        ImageField, IntegerField, ListField,
+                                        ListSerializer, ModelSerializer,
                                         PrimaryKeyRelatedField, ReadOnlyField,
                                         SerializerMethodField)
 from rest_framework.validators import UniqueTogetherValidator
 
-from foodgram.settings import MIN_COOKING_TIME, MIN_INGREDIENT_AMOUNT
+from api.images import (DecodedImage, ImageTooLargeError, decode_base64_image,
+                        get_image_extension, get_image_variants)
+from api.renditions import rendition_cache
+from foodgram.settings import (MIN_COOKING_TIME, MIN_INGREDIENT_AMOUNT,
+                               RECIPE_IMAGE_MAX_SIZE, RECIPE_IMAGE_RENDITIONS,
+                               RECIPE_IMAGE_SIZE_PARAM)
 from recipes.models import (Favorite, Ingredient, IngredientInRecipe, Recipe,
-                            ShoppingCart, Tag)
+                            ShoppingCart, ShoppingCartIngredient, Tag)
 from users.models import Follow
 
 User = get_user_model()
@@ -39,6 +42,8 @@ class UserSerializer(ModelSerializer):
         )
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         user = self.context.get('request').user
         return (
             user.is_authenticated and
@@ -64,15 +69,66 @@ class UserSerializer(ModelSerializer):
         return representation
 
 
-class SimpleRecipeSerializer(ModelSerializer):
+class PublicUserSerializer(UserSerializer):
+    """Сериализатор автора рецепта без признака подписки."""
+    is_subscribed = None
+
+    class Meta(UserSerializer.Meta):
+        fields = tuple(
+            field for field in UserSerializer.Meta.fields
+            if field != 'is_subscribed'
+        )
+
+
+class MediaUrlMixin:
+    """Построение полного адреса файла из хранилища для ответа API."""
+    def get_media_url(self, name):
+        url = default_storage.url(name)
+        request = self.context.get('request')
+        if request is not None:
+            return request.build_absolute_uri(url)
+        return url
+
+
+class SimpleRecipeSerializer(MediaUrlMixin, ModelSerializer):
     """
     Сериализатор для упрощённого отображения рецептов при работе с подписками
     и списками избранного и покупок."""
+    image = SerializerMethodField(method_name='get_image')
+
     class Meta:
         model = Recipe
         fields = ('id', 'name', 'image', 'cooking_time')
         read_only_fields = fields
 
+    def get_image_size(self):
+        request = self.context.get('request')
+        if request is None:
+            return None
+        size = request.query_params.get(RECIPE_IMAGE_SIZE_PARAM)
+        if size and size not in RECIPE_IMAGE_RENDITIONS:
+            raise ValidationError(detail={RECIPE_IMAGE_SIZE_PARAM: [
+                'Допустимые значения: '
+                f'{", ".join(RECIPE_IMAGE_RENDITIONS)}.'
+            ]})
+        return size
+
+    def get_image(self, obj):
+        """
+        Картинка рецепта; с параметром image_size - её уменьшенная копия,
+        которая строится при первом запросе.
+        """
+        source = get_image_variants(obj).get('full', obj.image.name)
+        if not source:
+            return None
+        size = self.get_image_size()
+        if size:
+            try:
+                return self.get_media_url(rendition_cache.get(source, size))
+            except OSError:
+                pass
+        return self.get_media_url(source)
+
 
 class SubscriptionSerializer(ModelSerializer):
     """Сериализатор сервиса подписок."""
@@ -98,12 +154,14 @@ class SubscriptionSerializer(ModelSerializer):
     def get_recipes(self, obj):
         limit = self.context.get('recipes_limit')
         recipes = obj.followee.recipes.all()
-        if limit:
-            recipes = recipes[int(limit):]
-        return SimpleRecipeSerializer(instance=recipes, many=True).data
+        if limit is not None:
+            recipes = recipes[:limit]
+        return SimpleRecipeSerializer(
+            instance=recipes, many=True, context=self.context
+        ).data
 
     def get_recipes_count(self, obj):
-        return obj.followee.recipes.count()
+        return obj.followee.recipes_count
 
     def is_valid(self, raise_exception=False):
         if self.context['request'].method == 'DELETE':
@@ -170,16 +228,23 @@ class SubscriptionsListSerializer(ModelSerializer):
         read_only_fields = fields
 
     def get_recipes(self, obj):
-        limit = self.context.get('recipes_limit')
-        recipes = obj.recipes.all()
-        if limit:
-            recipes = recipes[:int(limit)]
-        return SimpleRecipeSerializer(instance=recipes, many=True).data
+        if hasattr(obj, 'limited_recipes'):
+            recipes = obj.limited_recipes
+        else:
+            limit = self.context.get('recipes_limit')
+            recipes = obj.recipes.all()
+            if limit is not None:
+                recipes = recipes[:limit]
+        return SimpleRecipeSerializer(
+            instance=recipes, many=True, context=self.context
+        ).data
 
     def get_recipes_count(self, obj):
-        return obj.recipes.count()
+        return obj.recipes_count
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         user = self.context.get('request').user
         return (
             user.is_authenticated and
@@ -201,12 +266,54 @@ class IngredientSerializer(ModelSerializer):
         fields = ('id', 'name', 'measurement_unit')
 
 
+class ShoppingCartIngredientSerializer(ModelSerializer):
+    """Сериализатор сводного списка покупок."""
+    id = ReadOnlyField(source='ingredient.id')
+    name = ReadOnlyField(source='ingredient.name')
+    measurement_unit = ReadOnlyField(
+        source='ingredient.measurement_unit'
+    )
+
+    class Meta:
+        model = ShoppingCartIngredient
+        fields = ('id', 'name', 'measurement_unit', 'amount')
+
+
+class IngredientInRecipeListSerializer(ListSerializer):
+    """
+    Список ингредиентов рецепта. Все переданные id проверяются одним
+    запросом к базе данных, повторы находятся по множеству; ошибки
+    возвращаются сразу для всех неверных элементов списка.
+    """
+    def to_internal_value(self, data):
+        items = super().to_internal_value(data)
+        ingredients = Ingredient.objects.in_bulk(
+            {item['ingredient_id'] for item in items}
+        )
+        errors = []
+        seen = set()
+        for item in items:
+            ingredient_id = item.pop('ingredient_id')
+            if ingredient_id not in ingredients:
+                errors.append({'id': [
+                    f'Ингредиент с id {ingredient_id} недоступен.'
+                ]})
+            elif ingredient_id in seen:
+                errors.append({'id': [
+                    f'Ингредиент с id {ingredient_id} повторяется в рецепте.'
+                ]})
+            else:
+                errors.append({})
+            seen.add(ingredient_id)
+            item['ingredient'] = ingredients.get(ingredient_id)
+        if any(errors):
+            raise ValidationError(detail=errors)
+        return items
+
+
 class IngredientInRecipeSerializer(ModelSerializer):
     """Сериализатор для работы с ингрединтами в рецепте."""
-    id = PrimaryKeyRelatedField(
-        queryset=Ingredient.objects.all(),
-        source='ingredient'
-    )
+    id = IntegerField(source='ingredient_id')
     name = ReadOnlyField(source='ingredient.name')
     measurement_unit = ReadOnlyField(
         source='ingredient.measurement_unit'
@@ -220,9 +327,10 @@ class IngredientInRecipeSerializer(ModelSerializer):
             'measurement_unit',
             'amount'
         )
+        list_serializer_class = IngredientInRecipeListSerializer
 
 
-class RecipeReadSerializer(ModelSerializer):
+class RecipeReadSerializer(MediaUrlMixin, ModelSerializer):
     """Сериализатор для чтения рецептов."""
     tags = TagSerializer(many=True)
     author = UserSerializer()
@@ -236,6 +344,8 @@ class RecipeReadSerializer(ModelSerializer):
     is_in_shopping_cart = SerializerMethodField(
         method_name='get_is_in_shopping_cart'
     )
+    image = SerializerMethodField(method_name='get_image')
+    image_variants = SerializerMethodField(method_name='get_image_variants')
 
     class Meta:
         model = Recipe
@@ -248,11 +358,14 @@ class RecipeReadSerializer(ModelSerializer):
             'is_in_shopping_cart',
             'name',
             'image',
+            'image_variants',
             'text',
             'cooking_time'
         )
 
     def get_is_favorited(self, obj):
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         user = self.context.get('request').user
         return (
             user.is_authenticated and
@@ -260,36 +373,139 @@ class RecipeReadSerializer(ModelSerializer):
         )
 
     def get_is_in_shopping_cart(self, obj):
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         user = self.context.get('request').user
         return (
             user.is_authenticated and
             user.shops_for.filter(recipe=obj).exists()
         )
 
+    def get_image(self, obj):
+        """
+        Полноразмерный вариант картинки в WebP или JPEG, пока он не
+        построен - исходная картинка.
+        """
+        name = get_image_variants(obj).get('full', obj.image.name)
+        return self.get_media_url(name) if name else None
+
+    def get_image_variants(self, obj):
+        return {
+            variant: self.get_media_url(name)
+            for variant, name in get_image_variants(obj).items()
+        }
+
+    def to_representation(self, instance):
+        if hasattr(instance, 'is_author_subscribed'):
+            instance.author.is_subscribed = instance.is_author_subscribed
+        return super().to_representation(instance)
+
+
+class PantryRecipeSerializer(RecipeReadSerializer):
+    """
+    Сериализатор рецептов, подобранных по ингредиентам пользователя:
+    к рецепту добавляются число найденных и недостающих ингредиентов
+    и сами недостающие ингредиенты.
+    """
+    matched_ingredients_count = ReadOnlyField()
+    missing_ingredients_count = ReadOnlyField()
+    missing_ingredients = SerializerMethodField(
+        method_name='get_missing_ingredients'
+    )
+
+    class Meta(RecipeReadSerializer.Meta):
+        fields = RecipeReadSerializer.Meta.fields + (
+            'matched_ingredients_count',
+            'missing_ingredients_count',
+            'missing_ingredients'
+        )
+
+    def get_missing_ingredients(self, obj):
+        pantry = self.context['pantry']
+        return IngredientInRecipeSerializer(
+            (
+                item for item in obj.recipe_ingredients.all()
+                if item.ingredient_id not in pantry
+            ),
+            many=True
+        ).data
+
+
+class PublicRecipeSerializer(RecipeReadSerializer):
+    """
+    Сериализатор рецептов без признаков текущего пользователя: ответ
+    одинаков для всех пользователей и кешируется как общий, а признаки
+    запрашиваются отдельно (RecipeUserFlagsSerializer).
+    """
+    author = PublicUserSerializer()
+    is_favorited = None
+    is_in_shopping_cart = None
+
+    class Meta(RecipeReadSerializer.Meta):
+        fields = tuple(
+            field for field in RecipeReadSerializer.Meta.fields
+            if field not in ('is_favorited', 'is_in_shopping_cart')
+        )
+
+
+class RecipeUserFlagsSerializer(ModelSerializer):
+    """
+    Признаки текущего пользователя для рецепта: избранное, корзина
+    и подписка на автора. Рецепты должны быть выбраны с with_user_flags.
+    """
+    is_favorited = ReadOnlyField()
+    is_in_shopping_cart = ReadOnlyField()
+    author = SerializerMethodField(method_name='get_author')
+
+    class Meta:
+        model = Recipe
+        fields = ('id', 'is_favorited', 'is_in_shopping_cart', 'author')
+        read_only_fields = fields
+
+    def get_author(self, obj):
+        return {
+            'id': obj.author_id,
+            'is_subscribed': obj.is_author_subscribed
+        }
+
 
 class Base64ImageField(ImageField):
     """
     Кастомный тип поля для работы с картинками в формате строки base64.
+    Картинка декодируется частями с ограничением размера, поле возвращает
+    несохранённую картинку с именем по хешу содержимого (DecodedImage),
+    которую сохраняет сериализатор.
     """
+    default_error_messages = {
+        'too_large': 'Размер картинки больше {max_size} байт.',
+        'invalid_base64': 'Некорректная картинка в формате base64.',
+    }
+
     def to_internal_value(self, data):
-        if isinstance(data, str) and data.startswith('data:image'):
-            format, imgstr = data.split(';base64,')
-            ext = format.split('/')[-1]
-            id = uuid.uuid4()
-            data = ContentFile(
-                base64.b64decode(imgstr), name=id.urn[9:] + "." + ext
-            )
-        return super().to_internal_value(data)
+        if not (isinstance(data, str) and data.startswith('data:image')):
+            return super().to_internal_value(data)
+        try:
+            file = decode_base64_image(data)
+        except ImageTooLargeError:
+            self.fail('too_large', max_size=RECIPE_IMAGE_MAX_SIZE)
+        except ValueError:
+            self.fail('invalid_base64')
+        try:
+            extension = get_image_extension(file)
+        except ValueError:
+            file.close()
+            self.fail('invalid_image')
+        model_field = self.parent.Meta.model._meta.get_field(self.source)
+        return DecodedImage(file.file, name=model_field.generate_filename(
+            None, f'{file.name}.{extension}'
+        ))
 
 
 class RecipeCreateUpdateSerializer(ModelSerializer):
     """Сериализатор для создания и изменения рецепта."""
     author = HiddenField(default=CurrentUserDefault())
     ingredients = IngredientInRecipeSerializer(many=True)
-    tags = PrimaryKeyRelatedField(
-        queryset=Tag.objects.all(),
-        many=True
-    )
+    tags = ListField(child=IntegerField())
     image = Base64ImageField(
         max_length=None, use_url=True
     )
@@ -303,17 +519,7 @@ class RecipeCreateUpdateSerializer(ModelSerializer):
             raise ValidationError(detail={
                 'ingredients': [{'id': ['В рецепте нет ингредиентов.']}]
             })
-        ingredients = []
         for item in value:
-            ingredient = item.get('ingredient')
-            if not ingredient:
-                raise ValidationError(detail=[{
-                        'id': ['В рецепте указаны недоступные ингредиенты.']
-                }])
-            if item in ingredients:
-                raise ValidationError(detail=[{
-                    'id': ['В рецепте повторяются ингредиенты.']
-                }])
             if item['amount'] < MIN_INGREDIENT_AMOUNT:
                 raise ValidationError(detail=[{
                         'amount': [(
@@ -321,21 +527,20 @@ class RecipeCreateUpdateSerializer(ModelSerializer):
                             f'меньше {MIN_INGREDIENT_AMOUNT}.'
                         )]
                 }])
-            ingredients.append(item)
         return value
 
     def validate_tags(self, value):
         if not value:
             raise ValidationError(detail=['В рецепте нет ни одного тега.'])
-        tags = []
-        for item in value:
-            if not Tag.objects.filter(id=item.id).exists():
-                raise ValidationError(
-                    detail=['В рецепте указаны недоступные теги.']
-                )
-            if item in tags:
-                raise ValidationError(detail=['В рецепте повторяются теги.'])
-            tags.append(item)
+        # Проверка по базе данных, а не по справочнику в памяти процесса:
+        # тег мог быть удалён в другом процессе.
+        tags = Tag.objects.in_bulk(value)
+        if any(tag_id not in tags for tag_id in value):
+            raise ValidationError(
+                detail=['В рецепте указаны недоступные теги.']
+            )
+        if len(set(value)) != len(value):
+            raise ValidationError(detail=['В рецепте повторяются теги.'])
         return value
 
     def validate_cooking_time(self, value):
@@ -346,20 +551,69 @@ class RecipeCreateUpdateSerializer(ModelSerializer):
             )])
         return value
 
+    def store_image(self, validated_data):
+        """Сохраняет картинку в хранилище после проверки всех полей."""
+        image = validated_data.get('image')
+        if isinstance(image, DecodedImage):
+            validated_data['image'] = image.store()
+
     @transaction.atomic
     def create(self, validated_data):
+        self.store_image(validated_data)
         tags_data = validated_data.pop('tags')
         ingredients_data = validated_data.pop('ingredients')
         validated_data['author'] = self.context['request'].user
-        recipe = Recipe.objects.create(**validated_data)
-        for tag_data in tags_data:
-            recipe.tags.add(tag_data)
-        for ingredient_data in ingredients_data:
-            IngredientInRecipe.objects.create(recipe=recipe, **ingredient_data)
+        recipe = Recipe.objects.create(
+            ingredients_count=len(ingredients_data), **validated_data
+        )
+        recipe.tags.set(tags_data)
+        IngredientInRecipe.objects.bulk_create(
+            IngredientInRecipe(recipe=recipe, **ingredient_data)
+            for ingredient_data in ingredients_data
+        )
         return recipe
 
+    def update_ingredients(self, instance, ingredients_data):
+        """Записывает только изменившиеся ингредиенты рецепта."""
+        current = {
+            item.ingredient_id: item
+            for item in instance.recipe_ingredients.all()
+        }
+        old_amounts = {
+            ingredient_id: item.amount
+            for ingredient_id, item in current.items()
+        }
+        new_amounts = {
+            ingredient_data['ingredient'].id: ingredient_data['amount']
+            for ingredient_data in ingredients_data
+        }
+        removed = old_amounts.keys() - new_amounts.keys()
+        if removed:
+            instance.recipe_ingredients.filter(
+                ingredient_id__in=removed
+            ).delete()
+        IngredientInRecipe.objects.bulk_create(
+            IngredientInRecipe(
+                recipe=instance, ingredient_id=ingredient_id, amount=amount
+            )
+            for ingredient_id, amount in new_amounts.items()
+            if ingredient_id not in current
+        )
+        changed = []
+        for ingredient_id, amount in new_amounts.items():
+            item = current.get(ingredient_id)
+            if item is not None and item.amount != amount:
+                item.amount = amount
+                changed.append(item)
+        IngredientInRecipe.objects.bulk_update(changed, ('amount',))
+        return {
+            ingredient_id: amount - old_amounts.get(ingredient_id, 0)
+            for ingredient_id, amount in new_amounts.items()
+        }
+
     @transaction.atomic
     def update(self, instance, validated_data):
+        self.store_image(validated_data)
         tags_data = validated_data.pop('tags')
         ingredients_data = validated_data.pop('ingredients')
         instance.name = validated_data.get('name', instance.name)
@@ -368,20 +622,19 @@ class RecipeCreateUpdateSerializer(ModelSerializer):
         instance.cooking_time = validated_data.get(
             'cooking_time', instance.cooking_time
         )
+        instance.ingredients_count = len(ingredients_data)
         instance.save()
-        instance.tags.clear()
-        for tag_data in tags_data:
-            instance.tags.add(tag_data)
-        instance.ingredients.clear()
-        for ingredient_data in ingredients_data:
-            IngredientInRecipe.objects.create(
-                recipe=instance, **ingredient_data
-            )
+        instance.tags.set(tags_data)
+        ShoppingCartIngredient.objects.change_recipe(
+            instance.pk, self.update_ingredients(instance, ingredients_data)
+        )
         return instance
 
     def to_representation(self, instance):
+        request = self.context.get('request')
         return RecipeReadSerializer(
-            instance, context={'request': self.context.get('request')}
+            Recipe.objects.for_feed(request.user).get(pk=instance.pk),
+            context={'request': request}
         ).data
 
 
@@ -454,11 +707,13 @@ class ShoppingCartSerializer(ModelSerializer):
             return True
         return super().is_valid(raise_exception=True)
 
+    @transaction.atomic
     def save(self, **kwargs):
         instance = super().save(**kwargs)
         serializer = self.__class__(instance, context=self.context)
         return serializer.data
 
+    @transaction.atomic
     def delete(self):
         request = self.context.get('request')
         user = request.user
@@ -0,0 +1,162 @@
+import csv
+import hashlib
+import io
+import json
+import os
+
+from django.utils.http import quote_etag
+from django.utils.module_loading import import_string
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen.canvas import Canvas
+
+from foodgram.settings import (DEFAULT_CHARSET, SHOPPING_CART_CONTENT_TYPE,
+                               SHOPPING_CART_PDF_FONT, SHOPPING_CART_RENDERERS)
+
+TITLE = 'ВАШ СПИСОК ПОКУПОК'
+
+SIGNATURE = 'FOODGRAM'
+
+
+class ShoppingCartRenderer:
+    """
+    Базовый класс выгрузки списка покупок. Метод render принимает итератор
+    словарей с ключами ingredient__name, ingredient__measurement_unit и
+    amount и по частям отдаёт содержимое файла.
+    """
+    extension = None
+    content_type = None
+
+    def render(self, ingredients):
+        raise NotImplementedError
+
+
+class TextRenderer(ShoppingCartRenderer):
+    """Выгрузка списка покупок в текстовый файл."""
+    extension = 'txt'
+    content_type = f'{SHOPPING_CART_CONTENT_TYPE}; charset={DEFAULT_CHARSET}'
+
+    def render(self, ingredients):
+        yield f'{TITLE}: \n\n'
+        separator = ''
+        for ingredient in ingredients:
+            yield (
+                f"{separator}• {ingredient['ingredient__name']}"
+                f" ({ingredient['ingredient__measurement_unit']})"
+                f" -- {ingredient['amount']}"
+            )
+            separator = '\n'
+        yield f'\n\n{SIGNATURE}'
+
+
+class Echo:
+    """Псевдобуфер, возвращающий записанную в него строку."""
+    def write(self, value):
+        return value
+
+
+class CSVRenderer(ShoppingCartRenderer):
+    """Выгрузка списка покупок в формате CSV."""
+    extension = 'csv'
+    content_type = f'text/csv; charset={DEFAULT_CHARSET}'
+
+    def render(self, ingredients):
+        writer = csv.writer(Echo())
+        yield writer.writerow(
+            ('Ингредиент', 'Единица измерения', 'Количество')
+        )
+        for ingredient in ingredients:
+            yield writer.writerow((
+                ingredient['ingredient__name'],
+                ingredient['ingredient__measurement_unit'],
+                ingredient['amount']
+            ))
+
+
+class JSONRenderer(ShoppingCartRenderer):
+    """Выгрузка списка покупок в формате JSON."""
+    extension = 'json'
+    content_type = f'application/json; charset={DEFAULT_CHARSET}'
+
+    def render(self, ingredients):
+        yield '['
+        separator = ''
+        for ingredient in ingredients:
+            yield separator + json.dumps({
+                'name': ingredient['ingredient__name'],
+                'measurement_unit': ingredient['ingredient__measurement_unit'],
+                'amount': ingredient['amount'],
+            }, ensure_ascii=False)
+            separator = ','
+        yield ']'
+
+
+class PDFRenderer(ShoppingCartRenderer):
+    """
+    Выгрузка списка покупок в формате PDF. Документ собирается целиком,
+    так как таблица ссылок PDF записывается в конец файла.
+    """
+    extension = 'pdf'
+    content_type = 'application/pdf'
+    font_name = 'ShoppingCartFont'
+    font_size = 12
+    margin = 50
+    line_height = 18
+
+    def get_font(self):
+        if self.font_name in pdfmetrics.getRegisteredFontNames():
+            return self.font_name
+        if not os.path.exists(SHOPPING_CART_PDF_FONT):
+            return 'Helvetica'
+        pdfmetrics.registerFont(TTFont(self.font_name, SHOPPING_CART_PDF_FONT))
+        return self.font_name
+
+    def render(self, ingredients):
+        buffer = io.BytesIO()
+        canvas = Canvas(buffer, pagesize=A4)
+        font = self.get_font()
+        _, height = A4
+        y = height - self.margin
+        canvas.setFont(font, self.font_size)
+        canvas.drawString(self.margin, y, TITLE)
+        y -= 2 * self.line_height
+        for ingredient in ingredients:
+            if y < self.margin:
+                canvas.showPage()
+                canvas.setFont(font, self.font_size)
+                y = height - self.margin
+            canvas.drawString(
+                self.margin, y,
+                f"• {ingredient['ingredient__name']}"
+                f" ({ingredient['ingredient__measurement_unit']})"
+                f" -- {ingredient['amount']}"
+            )
+            y -= self.line_height
+        canvas.drawString(self.margin, self.margin / 2, SIGNATURE)
+        canvas.save()
+        yield buffer.getvalue()
+
+
+def get_etag(prefix, ingredients):
+    """
+    ETag выгрузки: хеш строк списка покупок вместе с названиями и единицами
+    измерения ингредиентов. Возвращает None, если список пуст.
+    """
+    digest = hashlib.md5(prefix.encode())
+    empty = True
+    for ingredient in ingredients:
+        empty = False
+        digest.update(repr(tuple(ingredient.values())).encode())
+    return None if empty else quote_etag(digest.hexdigest())
+
+
+def get_renderer(file_format):
+    """
+    Возвращает выгрузку для указанного формата из настройки
+    SHOPPING_CART_RENDERERS или None, если формат не поддерживается.
+    """
+    path = SHOPPING_CART_RENDERERS.get(file_format)
+    if path is None:
+        return None
+    return import_string(path)()
@@ -0,0 +1,261 @@
+from collections import defaultdict
+from functools import partial
+from weakref import WeakKeyDictionary
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import F, QuerySet
+from django.db.models.functions import Greatest
+from django.db.models.signals import (post_delete, post_save, pre_delete,
+                                      pre_save)
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from api.authentication import token_cache
+from api.catalog import ingredient_catalog, tag_catalog
+from api.images import get_image_variants, image_worker
+from api.response_cache import (POPULARITY_TAG, RECIPES_TAG, USERS_TAG,
+                                ingredient_tag, personal_tag, recipe_tag,
+                                response_cache, tag_tag, user_tag)
+from recipes.models import (Favorite, Ingredient, IngredientInRecipe, Recipe,
+                            ShoppingCart, ShoppingCartIngredient, Tag)
+from users.models import Follow
+
+User = get_user_model()
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def bump_tag_catalog(**kwargs):
+    transaction.on_commit(tag_catalog.bump)
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def bump_ingredient_catalog(**kwargs):
+    transaction.on_commit(ingredient_catalog.bump)
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+def invalidate_recipe(instance, **kwargs):
+    # Теги и ингредиенты рецепта меняются вместе с сохранением рецепта.
+    # Обработчики m2m_changed и удаления ингредиентов рецепта не
+    # используются: с ними Django не может вставлять связи и удалять строки
+    # без предварительного чтения.
+    response_cache.invalidate_on_commit(recipe_tag(instance.pk), RECIPES_TAG)
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def invalidate_tag(instance, **kwargs):
+    # Слаг тега используется в фильтре списка рецептов.
+    response_cache.invalidate_on_commit(tag_tag(instance.pk), RECIPES_TAG)
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def invalidate_ingredient(instance, **kwargs):
+    response_cache.invalidate_on_commit(ingredient_tag(instance.pk))
+
+
+@receiver((post_save, post_delete), sender=User)
+def invalidate_user(instance, created=False, update_fields=None, **kwargs):
+    # Время последнего входа в ответах не отдаётся, а у нового пользователя
+    # ещё нет рецептов.
+    if update_fields is not None and not set(update_fields) - {'last_login'}:
+        return
+    # Смена пароля, блокировка и права проверяются по пользователю из кеша
+    # токенов.
+    transaction.on_commit(partial(token_cache.delete_user, instance.pk))
+    tags = [user_tag(instance.pk)]
+    if not created:
+        tags.append(USERS_TAG)
+    response_cache.invalidate_on_commit(*tags)
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_token(instance, **kwargs):
+    transaction.on_commit(partial(token_cache.delete, instance.key))
+
+
+@receiver((post_save, post_delete), sender=Favorite)
+def invalidate_favorite(instance, **kwargs):
+    response_cache.invalidate_on_commit(
+        personal_tag(instance.user_id), POPULARITY_TAG
+    )
+
+
+@receiver((post_save, post_delete), sender=ShoppingCart)
+def invalidate_shopping_cart(instance, **kwargs):
+    response_cache.invalidate_on_commit(personal_tag(instance.user_id))
+
+
+@receiver((post_save, post_delete), sender=Follow)
+def invalidate_follow(instance, **kwargs):
+    response_cache.invalidate_on_commit(personal_tag(instance.follower_id))
+
+
+@receiver(post_save, sender=Recipe)
+def process_recipe_image(instance, **kwargs):
+    if instance.image and not get_image_variants(instance):
+        transaction.on_commit(
+            partial(image_worker.enqueue, instance.image.name, instance.pk)
+        )
+
+
+def change_counter(model, pk, field, delta):
+    """
+    Изменяет счётчик field записи model на delta одним запросом UPDATE
+    с выражением F, без чтения записи; счётчик не становится меньше нуля.
+    """
+    model.objects.filter(pk=pk).update(
+        **{field: Greatest(F(field) + delta, 0)}
+    )
+
+
+def is_deleted_with(origin, model, pk):
+    """Удаляется ли запись model с pk вместе с исходным объектом удаления."""
+    return isinstance(origin, model) and origin.pk == pk
+
+
+@receiver(post_save, sender=Favorite)
+def count_favorite(instance, created, raw=False, **kwargs):
+    if created and not raw:
+        change_counter(Recipe, instance.recipe_id, 'favorites_count', 1)
+
+
+@receiver(post_delete, sender=Favorite)
+def uncount_favorite(instance, origin=None, **kwargs):
+    if not is_deleted_with(origin, Recipe, instance.recipe_id):
+        change_counter(Recipe, instance.recipe_id, 'favorites_count', -1)
+
+
+@receiver(post_save, sender=ShoppingCart)
+def count_shopping_cart(instance, created, raw=False, **kwargs):
+    if created and not raw:
+        change_counter(Recipe, instance.recipe_id, 'shopping_carts_count', 1)
+
+
+@receiver(post_delete, sender=ShoppingCart)
+def uncount_shopping_cart(instance, origin=None, **kwargs):
+    if not is_deleted_with(origin, Recipe, instance.recipe_id):
+        change_counter(
+            Recipe, instance.recipe_id, 'shopping_carts_count', -1
+        )
+
+
+@receiver(post_save, sender=Follow)
+def count_follow(instance, created, raw=False, **kwargs):
+    if created and not raw:
+        change_counter(User, instance.followee_id, 'followers_count', 1)
+
+
+@receiver(post_delete, sender=Follow)
+def uncount_follow(instance, origin=None, **kwargs):
+    if not is_deleted_with(origin, User, instance.followee_id):
+        change_counter(User, instance.followee_id, 'followers_count', -1)
+
+
+@receiver(post_save, sender=Recipe)
+def count_recipe(instance, created, raw=False, **kwargs):
+    if created and not raw:
+        change_counter(User, instance.author_id, 'recipes_count', 1)
+
+
+@receiver(post_delete, sender=Recipe)
+def uncount_recipe(instance, origin=None, **kwargs):
+    if not is_deleted_with(origin, User, instance.author_id):
+        change_counter(User, instance.author_id, 'recipes_count', -1)
+
+
+def is_deleted_directly(origin, model):
+    """
+    Удаляется ли запись model сама по себе (объектом или набором
+    запросов), а не каскадом вместе с другим объектом.
+    """
+    return isinstance(origin, model) or (
+        isinstance(origin, QuerySet) and origin.model is model
+    )
+
+
+@receiver(pre_delete, sender=Recipe)
+def remove_recipe_from_shopping_lists(instance, **kwargs):
+    # До удаления: вместе с рецептом каскадом удаляются его ингредиенты
+    # и корзины, обработчики которых каскадное удаление пропускают.
+    ShoppingCartIngredient.objects.delete_recipe(instance.pk)
+
+
+@receiver(pre_save, sender=ShoppingCart)
+def remove_changed_cart_from_shopping_list(instance, raw=False, **kwargs):
+    if raw or instance._state.adding:
+        return
+    old = ShoppingCart.objects.filter(pk=instance.pk).values(
+        'user_id', 'recipe_id'
+    ).first()
+    if old is not None:
+        ShoppingCartIngredient.objects.remove_recipe(**old)
+
+
+@receiver(post_save, sender=ShoppingCart)
+def add_cart_to_shopping_list(instance, raw=False, **kwargs):
+    if not raw:
+        ShoppingCartIngredient.objects.add_recipe(
+            instance.user_id, instance.recipe_id
+        )
+
+
+@receiver(post_delete, sender=ShoppingCart)
+def remove_cart_from_shopping_list(instance, origin=None, **kwargs):
+    # Список покупок удаляемого пользователя удаляется вместе с ним.
+    if is_deleted_directly(origin, ShoppingCart):
+        ShoppingCartIngredient.objects.remove_recipe(
+            instance.user_id, instance.recipe_id
+        )
+
+
+@receiver(pre_save, sender=IngredientInRecipe)
+def remove_changed_ingredient_from_shopping_lists(instance, raw=False,
+                                                  **kwargs):
+    if raw or instance._state.adding:
+        return
+    old = IngredientInRecipe.objects.filter(pk=instance.pk).values(
+        'recipe_id', 'ingredient_id', 'amount'
+    ).first()
+    if old is not None:
+        ShoppingCartIngredient.objects.change_recipe(
+            old['recipe_id'], {old['ingredient_id']: -old['amount']}
+        )
+
+
+@receiver(post_save, sender=IngredientInRecipe)
+def add_ingredient_to_shopping_lists(instance, raw=False, **kwargs):
+    if not raw:
+        ShoppingCartIngredient.objects.change_recipe(
+            instance.recipe_id, {instance.ingredient_id: instance.amount}
+        )
+
+
+# Id строк ингредиентов, уже вычтенных из списков покупок, по наборам
+# запросов, которыми они удаляются.
+deleted_ingredients = WeakKeyDictionary()
+
+
+@receiver(pre_delete, sender=IngredientInRecipe)
+def remove_ingredient_from_shopping_lists(instance, origin=None, **kwargs):
+    """Вычитает удаляемые ингредиенты из списков покупок."""
+    if isinstance(origin, IngredientInRecipe):
+        rows = [(
+            instance.pk, instance.recipe_id, instance.ingredient_id,
+            instance.amount
+        )]
+    elif is_deleted_directly(origin, IngredientInRecipe):
+        handled = deleted_ingredients.setdefault(origin, set())
+        if instance.pk in handled:
+            return
+        rows = list(origin.order_by().values_list(
+            'pk', 'recipe_id', 'ingredient_id', 'amount'
+        ))
+        handled.update(pk for pk, *_ in rows)
+    else:
+        return
+    deltas = defaultdict(dict)
+    for _, recipe_id, ingredient_id, amount in rows:
+        deltas[recipe_id][ingredient_id] = -amount
+    for recipe_id, recipe_deltas in deltas.items():
+        ShoppingCartIngredient.objects.change_recipe(recipe_id, recipe_deltas)
@@ -0,0 +1,46 @@
+from django.test import TestCase
+
+from api.autocomplete import ingredient_index, search_in_database
+from api.catalog import ingredient_catalog
+from recipes.models import Ingredient
+
+NAMES = (
+    'Apple', 'apricot', 'Pineapple', 'APPLE juice', 'grape', 'Grapefruit',
+    'соль', 'Соль морская', 'соус соевый', 'фасоль', 'Сахар', 'сахарная пудра',
+    'кукуруза', 'Кукурузная мука', '50% сливки', 'сливки_33',
+)
+
+QUERIES = (
+    '', 'a', 'A', 'ap', 'APP', 'apple', 'ple', 'gr', 'Fruit', 'x',
+    'с', 'С', 'со', 'Со', 'соль', 'оль', 'сах', 'Сах', 'кукуруз', 'уз',
+    '%', '_', 'и',
+)
+
+
+class IngredientIndexTest(TestCase):
+    """Подсказки из индекса в памяти совпадают с поиском в базе данных."""
+    @classmethod
+    def setUpTestData(cls):
+        Ingredient.objects.bulk_create(
+            Ingredient(name=name, measurement_unit='г') for name in NAMES
+        )
+
+    def setUp(self):
+        ingredient_catalog.bump()
+
+    def test_search_matches_database(self):
+        for limit in (3, len(NAMES)):
+            for value in QUERIES:
+                with self.subTest(value=value, limit=limit):
+                    prefixed, contained = ingredient_index.search(
+                        value, limit
+                    )
+                    self.assertEqual(
+                        prefixed + contained,
+                        [
+                            ingredient.id
+                            for ingredient in search_in_database(
+                                Ingredient.objects.all(), value, limit
+                            )
+                        ]
+                    )
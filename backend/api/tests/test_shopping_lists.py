@@ -0,0 +1,146 @@
+import tempfile
+
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from api.management.benchmark import make_base64_image
+from recipes.models import (Ingredient, IngredientInRecipe, Recipe,
+                            ShoppingCartIngredient, Tag)
+from users.models import User
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(), RECIPE_IMAGE_ASYNC=False)
+class ShoppingListTotalsTest(TestCase):
+    """Суммы сводного списка покупок после изменений через API."""
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username='author', email='author@example.com',
+            first_name='Автор', last_name='Рецептов', password='password'
+        )
+        cls.shopper = User.objects.create_user(
+            username='shopper', email='shopper@example.com',
+            first_name='Покупатель', last_name='Продуктов',
+            password='password'
+        )
+        cls.tag = Tag.objects.create(
+            name='Завтрак', color='#E26C2D', slug='breakfast'
+        )
+        cls.ingredients = [
+            Ingredient.objects.create(
+                name=f'Ингредиент {number}', measurement_unit='г'
+            )
+            for number in range(4)
+        ]
+
+    def setUp(self):
+        self.author_client = APIClient()
+        self.author_client.force_authenticate(self.author)
+        self.shopper_client = APIClient()
+        self.shopper_client.force_authenticate(self.shopper)
+
+    def recipe_data(self, amounts):
+        return {
+            'name': 'Рецепт',
+            'text': 'Описание',
+            'cooking_time': 10,
+            'image': make_base64_image(),
+            'tags': [self.tag.id],
+            'ingredients': [
+                {'id': self.ingredients[index].id, 'amount': amount}
+                for index, amount in amounts.items()
+            ],
+        }
+
+    def create_recipe(self, amounts):
+        response = self.author_client.post(
+            '/api/recipes/', self.recipe_data(amounts), format='json'
+        )
+        self.assertEqual(response.status_code, 201, response.data)
+        return response.data['id']
+
+    def toggle_cart(self, recipe_id, add=True):
+        method = self.shopper_client.post if add else (
+            self.shopper_client.delete
+        )
+        response = method(f'/api/recipes/{recipe_id}/shopping_cart/')
+        self.assertEqual(response.status_code, 201 if add else 204)
+
+    def assert_totals(self, expected):
+        """Сравнивает список покупателя с ожидаемым и с пересчётом."""
+        totals = dict(
+            ShoppingCartIngredient.objects.filter(
+                user=self.shopper
+            ).values_list('ingredient_id', 'amount')
+        )
+        self.assertEqual(totals, {
+            self.ingredients[index].id: amount
+            for index, amount in expected.items()
+        })
+        self.assertEqual(totals, {
+            row['recipe__recipe_ingredients__ingredient_id']: row['total']
+            for row in ShoppingCartIngredient.objects.calculate().filter(
+                user=self.shopper
+            )
+        })
+
+    def test_cart_toggles(self):
+        first = self.create_recipe({0: 100, 1: 20})
+        second = self.create_recipe({1: 30, 2: 5})
+        self.toggle_cart(first)
+        self.assert_totals({0: 100, 1: 20})
+        self.toggle_cart(second)
+        self.assert_totals({0: 100, 1: 50, 2: 5})
+        self.toggle_cart(first, add=False)
+        self.assert_totals({1: 30, 2: 5})
+        self.toggle_cart(second, add=False)
+        self.assert_totals({})
+
+    def test_recipe_update(self):
+        recipe_id = self.create_recipe({0: 100, 1: 20, 2: 5})
+        other = self.create_recipe({1: 10})
+        self.toggle_cart(recipe_id)
+        self.toggle_cart(other)
+        data = self.recipe_data({0: 150, 1: 20, 3: 7})
+        del data['image']
+        response = self.author_client.patch(
+            f'/api/recipes/{recipe_id}/', data, format='json'
+        )
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assert_totals({0: 150, 1: 30, 3: 7})
+
+    def test_recipe_delete(self):
+        recipe_id = self.create_recipe({0: 100, 1: 20})
+        other = self.create_recipe({1: 10})
+        self.toggle_cart(recipe_id)
+        self.toggle_cart(other)
+        response = self.author_client.delete(f'/api/recipes/{recipe_id}/')
+        self.assertEqual(response.status_code, 204)
+        self.assert_totals({1: 10})
+
+    def test_ingredients_changed_without_api(self):
+        recipe_id = self.create_recipe({0: 100, 1: 20})
+        self.toggle_cart(recipe_id)
+        IngredientInRecipe.objects.filter(
+            recipe_id=recipe_id, ingredient=self.ingredients[0]
+        ).delete()
+        IngredientInRecipe.objects.create(
+            recipe_id=recipe_id, ingredient=self.ingredients[2], amount=3
+        )
+        self.assert_totals({1: 20, 2: 3})
+        Recipe.objects.filter(pk=recipe_id).delete()
+        self.assert_totals({})
+
+    def test_download_etag_follows_ingredient_changes(self):
+        recipe_id = self.create_recipe({0: 100})
+        self.toggle_cart(recipe_id)
+        url = '/api/recipes/download_shopping_cart/'
+        etag = self.shopper_client.get(url)['ETag']
+        response = self.shopper_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        ingredient = self.ingredients[0]
+        ingredient.measurement_unit = 'кг'
+        ingredient.save()
+        response = self.shopper_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('(кг)', b''.join(response.streaming_content).decode())
@@ -1,31 +1,78 @@
+import hashlib
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.db.models import Sum
-from django.http import HttpResponse
+from django.db.models import Prefetch, Value
+from django.http import Http404, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
+from rest_framework.serializers import BooleanField, IntegerField, ListField
 from rest_framework.status import (HTTP_201_CREATED, HTTP_204_NO_CONTENT,
                                    HTTP_400_BAD_REQUEST)
 from rest_framework.viewsets import ModelViewSet
 
-from api.filters import IngredientFilter, RecipeFilter
+from api.autocomplete import database_search_enabled, suggest_from_index
+from api.catalog import ingredient_catalog, tag_catalog
+from api.edge_cache import set_cache_headers
+from api.filters import (ORDERING_POPULAR, PERSONAL_FILTERS, IngredientFilter,
+                         RecipeFilter)
+from api.pagination import KeysetPagination, PopularKeysetPagination
 from api.permissions import (IsActive, IsAdminOrReadOnly,
                              IsAuthorAdminOrReadOnly,
                              IsFollowerAdminOrReadOnly)
+from api.response_cache import (POPULARITY_TAG, RECIPES_TAG, USERS_TAG,
+                                get_dependencies, is_cacheable, personal_tag,
+                                recipe_tag, response_cache)
 from api.serializers import (FavoriteSerializer, IngredientSerializer,
+                             PantryRecipeSerializer, PublicRecipeSerializer,
                              RecipeCreateUpdateSerializer,
-                             RecipeReadSerializer, ShoppingCartSerializer,
-                             SubscriptionSerializer,
+                             RecipeReadSerializer, RecipeUserFlagsSerializer,
+                             ShoppingCartIngredientSerializer,
+                             ShoppingCartSerializer, SubscriptionSerializer,
                              SubscriptionsListSerializer, TagSerializer,
                              UserSerializer)
-from foodgram.settings import DEFAULT_CHARSET, SHOPPING_CART_CONTENT_TYPE
-from recipes.models import Ingredient, IngredientInRecipe, Recipe, Tag
+from api.shopping_cart import get_etag, get_renderer
+from foodgram.settings import (PANTRY_INGREDIENTS_PARAM,
+                               PANTRY_MAX_INGREDIENTS,
+                               PANTRY_MAX_MISSING_PARAM,
+                               RECIPE_FLAGS_IDS_PARAM, RECIPE_FLAGS_MAX_IDS,
+                               RECIPE_PAGINATION_CURSOR,
+                               RECIPE_PAGINATION_HEADER,
+                               RECIPE_PAGINATION_PARAM, RECIPE_PUBLIC_PARAM,
+                               RECIPES_LIMIT_PARAM, SHOPPING_CART_CHUNK_SIZE,
+                               SHOPPING_CART_DEFAULT_FORMAT,
+                               SHOPPING_CART_FORMAT_PARAM,
+                               SHOPPING_CART_RENDERERS)
+from recipes.models import Ingredient, Recipe, Tag
 
 User = get_user_model()
 
 
+def parse_query_param(request, name, field):
+    """
+    Значение параметра запроса name, проверенное полем сериализатора field.
+    Для списка берутся все значения повторяющегося параметра, пустой
+    параметр с одним значением возвращается как None. Ошибка проверки
+    отдаётся под именем параметра.
+    """
+    if isinstance(field, ListField):
+        value = request.query_params.getlist(name)
+    else:
+        value = request.query_params.get(name)
+        if not value:
+            return None
+    try:
+        return field.run_validation(value)
+    except ValidationError as error:
+        raise ValidationError(detail={name: error.detail})
+
+
 class AddRemoveMixin:
     """
     Миксин для типичных действий добавления/удаления подписки на другого
@@ -71,13 +118,36 @@ class UserViewSet(AddRemoveMixin, UserViewSet):
             return SubscriptionSerializer
         return UserSerializer
 
+    def get_recipes_limit(self):
+        return parse_query_param(
+            self.request, RECIPES_LIMIT_PARAM, IntegerField(min_value=0)
+        )
+
     @action(
         methods=('get',),
         detail=False
     )
     def subscriptions(self, request):
-        queryset = User.objects.filter(followed_by__follower=request.user)
-        recipes_limit = request.query_params.get('recipes_limit')
+        """
+        Подписки пользователя: число рецептов автора берётся из счётчика
+        в записи автора, а последние recipes_limit рецептов всех авторов
+        страницы загружаются одним запросом с оконной функцией ROW_NUMBER
+        по автору.
+        """
+        recipes_limit = self.get_recipes_limit()
+        recipes = Recipe.objects.only(
+            'id', 'author_id', 'name', 'image', 'image_variants',
+            'cooking_time'
+        )
+        if recipes_limit is not None:
+            recipes = recipes[:recipes_limit]
+        queryset = User.objects.filter(
+            followed_by__follower=request.user
+        ).annotate(
+            is_subscribed=Value(True)
+        ).prefetch_related(
+            Prefetch('recipes', queryset=recipes, to_attr='limited_recipes')
+        ).order_by(*User._meta.ordering)
         pages = self.paginate_queryset(queryset)
         serializer = SubscriptionsListSerializer(
             instance=pages,
@@ -94,21 +164,93 @@ class UserViewSet(AddRemoveMixin, UserViewSet):
         detail=True
     )
     def subscribe(self, request, id):
-        context = {'request': request, 'followee_id': id}
+        context = {
+            'request': request,
+            'followee_id': id,
+            'recipes_limit': self.get_recipes_limit()
+        }
         if request.method == 'POST':
             request.data['followee'] = id
         return self.add_remove_action(request, context)
 
 
-class TagViewSet(ModelViewSet):
+class ConditionalGetMixin:
+    """Миксин для условных GET-запросов по версиям данных."""
+    cache_vary = ()
+
+    def is_shared(self, request):
+        """Одинаков ли ответ для всех пользователей."""
+        return not request.user.is_authenticated
+
+    def get_conditional_response(self, view, request, *args, **kwargs):
+        shared = self.is_shared(request)
+        if not settings.SHARED_CACHE:
+            response = view(request, *args, **kwargs)
+            if response.status_code == 200:
+                set_cache_headers(response, shared, self.cache_vary)
+            return response
+        versions = self.get_versions(request)
+        etag = quote_etag(hashlib.md5(repr((
+            versions,
+            None if shared else request.user.pk,
+            request.accepted_renderer.format,
+            request.headers.get(RECIPE_PAGINATION_HEADER),
+        )).encode()).hexdigest())
+        last_modified = max(versions) // 10 ** 9
+        not_modified = get_conditional_response(
+            request, etag=etag, last_modified=last_modified
+        )
+        if not_modified is not None:
+            set_cache_headers(not_modified, shared, vary=self.cache_vary)
+            return not_modified
+        response = view(request, *args, **kwargs)
+        if response.status_code == 200:
+            response['ETag'] = etag
+            response['Last-Modified'] = http_date(last_modified)
+            set_cache_headers(response, shared, self.cache_vary)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.get_conditional_response(
+            super().list, request, *args, **kwargs
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.get_conditional_response(
+            super().retrieve, request, *args, **kwargs
+        )
+
+
+class CatalogMixin:
+    """
+    Миксин для чтения справочных данных из кеша справочника без запросов
+    к базе данных.
+    """
+    catalog = None
+
+    def list(self, request, *args, **kwargs):
+        return Response(self.catalog.get_items())
+
+    def retrieve(self, request, *args, **kwargs):
+        item = self.catalog.get_item(kwargs.get(self.lookup_field))
+        if item is None:
+            raise Http404
+        return Response(item)
+
+    def get_versions(self, request):
+        return [self.catalog.get_version()]
+
+
+class TagViewSet(ConditionalGetMixin, CatalogMixin, ModelViewSet):
     """Вьюсет для работы с тегами."""
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     permission_classes = (IsAdminOrReadOnly,)
     pagination_class = None
+    catalog = tag_catalog
 
 
-class IngredientViewSet(ModelViewSet):
+class IngredientViewSet(ConditionalGetMixin, CatalogMixin, ModelViewSet):
     """Вьюсет для работы с  ингредиентами."""
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
@@ -116,17 +258,150 @@ class IngredientViewSet(ModelViewSet):
     filter_backends = (DjangoFilterBackend,)
     filterset_class = IngredientFilter
     pagination_class = None
+    catalog = ingredient_catalog
+
+    def list(self, request, *args, **kwargs):
+        return self.get_conditional_response(
+            self.search, request, *args, **kwargs
+        )
+
+    def search(self, request, *args, **kwargs):
+        name = request.query_params.get('name')
+        if not name:
+            return CatalogMixin.list(self, request, *args, **kwargs)
+        if not database_search_enabled():
+            return Response(suggest_from_index(name))
+        return ModelViewSet.list(self, request, *args, **kwargs)
+
 
+class AnonymousCacheMixin:
+    """Миксин для кеширования ответов, одинаковых для всех пользователей."""
+    def get_cached_response(self, view, tags, request, *args, **kwargs):
+        if not (is_cacheable(request) and self.is_shared(request)):
+            return view(request, *args, **kwargs)
+        key = response_cache.get_key(request)
+        data = response_cache.get(key)
+        if data is not None:
+            return Response(data)
+        response = view(request, *args, **kwargs)
+        if response.status_code == 200:
+            response_cache.set(
+                key, response.data, get_dependencies(response.data) | tags
+            )
+        return response
+
+    def get_list_tags(self, request):
+        tags = {RECIPES_TAG}
+        if request.query_params.get('ordering') == ORDERING_POPULAR:
+            tags.add(POPULARITY_TAG)
+        return tags
 
-class RecipeViewSet(AddRemoveMixin, ModelViewSet):
+    def list(self, request, *args, **kwargs):
+        return self.get_cached_response(
+            super().list, self.get_list_tags(request),
+            request, *args, **kwargs
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.get_cached_response(
+            super().retrieve, set(), request, *args, **kwargs
+        )
+
+
+class RecipeViewSet(ConditionalGetMixin, AnonymousCacheMixin, AddRemoveMixin,
+                    ModelViewSet):
     """Вьюсет для работы с рецептами."""
     queryset = Recipe.objects.all()
     lookup_field = 'id'
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
+    cache_vary = (RECIPE_PAGINATION_HEADER,)
+
+    @property
+    def paginator(self):
+        """
+        Список рецептов можно листать по курсору вместо номеров страниц,
+        передав параметр или заголовок pagination=cursor: от новых
+        к старым или, с ordering=popular, от популярных к менее популярным.
+        """
+        if not hasattr(self, '_paginator'):
+            request = self.request
+            mode = request.query_params.get(
+                RECIPE_PAGINATION_PARAM,
+                request.headers.get(RECIPE_PAGINATION_HEADER)
+            )
+            if self.action == 'list' and mode == RECIPE_PAGINATION_CURSOR:
+                self._paginator = self.get_keyset_paginator()
+            else:
+                self._paginator = super().paginator
+        return self._paginator
+
+    def get_keyset_paginator(self):
+        """
+        Пагинация по курсору в порядке списка. Результаты поиска
+        упорядочены по релевантности, ключа для курсора у них нет.
+        """
+        params = self.request.query_params
+        if params.get('search'):
+            raise ValidationError(detail={RECIPE_PAGINATION_PARAM: [
+                'Результаты поиска нельзя листать по курсору.'
+            ]})
+        if params.get('ordering') == ORDERING_POPULAR:
+            return PopularKeysetPagination()
+        return KeysetPagination()
+
+    def get_versions(self, request):
+        """
+        Версии таблицы пользователей, справочников и рецептов списка или
+        самого рецепта, а также избранного, корзины и подписок текущего
+        пользователя, от которых зависят признаки в ответе.
+        """
+        if self.action == 'list':
+            tags = self.get_list_tags(request)
+        else:
+            tags = {recipe_tag(self.kwargs[self.lookup_field])}
+        tags.add(USERS_TAG)
+        if not self.is_shared(request):
+            tags.add(personal_tag(request.user.pk))
+        versions = response_cache.get_versions(sorted(tags))
+        return [
+            *versions.values(),
+            tag_catalog.get_version(),
+            ingredient_catalog.get_version(),
+        ]
+
+    def is_public(self):
+        """
+        Запрошены ли список или рецепт без признаков текущего пользователя
+        (параметр public=1).
+        """
+        if self.action not in ('list', 'retrieve'):
+            return False
+        return bool(parse_query_param(
+            self.request, RECIPE_PUBLIC_PARAM, BooleanField()
+        ))
+
+    def is_shared(self, request):
+        """
+        Ответ одинаков для всех пользователей для анонимного пользователя
+        и в режиме public=1 без фильтров по избранному и корзине.
+        """
+        return super().is_shared(request) or (
+            self.is_public() and
+            not any(name in request.query_params for name in PERSONAL_FILTERS)
+        )
+
+    def get_queryset(self):
+        if self.is_public():
+            return Recipe.objects.with_related()
+        if self.action in ('list', 'retrieve', 'update', 'partial_update'):
+            return Recipe.objects.for_feed(self.request.user)
+        return super().get_queryset()
 
     def get_serializer_class(self):
         if self.action in ('list', 'retrieve'):
+            if self.is_public():
+                return PublicRecipeSerializer
             return RecipeReadSerializer
         if self.action in ('create', 'update', 'partial_update'):
             return RecipeCreateUpdateSerializer
@@ -137,7 +412,10 @@ class RecipeViewSet(AddRemoveMixin, ModelViewSet):
         return RecipeReadSerializer
 
     def get_permissions(self):
-        if self.action == 'create':
+        if self.action in (
+            'create', 'feed', 'flags', 'download_shopping_cart',
+            'shopping_cart_summary'
+        ):
             return (IsActive(),)
         if (
             self.action in ('shopping_cart', 'favorite')
@@ -145,6 +423,100 @@ class RecipeViewSet(AddRemoveMixin, ModelViewSet):
             return (IsActive(),)
         return (IsAuthorAdminOrReadOnly(),)
 
+    @action(
+        methods=('get',),
+        detail=False,
+        permission_classes=(IsActive,),
+        pagination_class=KeysetPagination
+    )
+    def feed(self, request):
+        """
+        Лента рецептов авторов, на которых подписан пользователь, от новых
+        к старым, с постраничной прокруткой по курсору.
+        """
+        queryset = self.filter_queryset(
+            Recipe.objects.for_feed(request.user).filter(
+                author__in=request.user.follows.values('followee')
+            )
+        )
+        page = self.paginate_queryset(queryset)
+        serializer = RecipeReadSerializer(
+            page, many=True, context=self.get_serializer_context()
+        )
+        return self.get_paginated_response(serializer.data)
+
+    def get_flags_ids(self):
+        """Id рецептов из параметра ids (параметр повторяется)."""
+        return parse_query_param(
+            self.request, RECIPE_FLAGS_IDS_PARAM, ListField(
+                child=IntegerField(min_value=1),
+                allow_empty=False,
+                max_length=RECIPE_FLAGS_MAX_IDS
+            )
+        )
+
+    @action(
+        methods=('get',),
+        detail=False,
+        permission_classes=(IsActive,)
+    )
+    def flags(self, request):
+        """
+        Признаки текущего пользователя (избранное, корзина, подписка
+        на автора) для рецептов из параметра ids одним запросом. Вместе
+        со списком в режиме public=1, общим для всех пользователей,
+        заменяют признаки в ответе обычного списка.
+        """
+        recipes = Recipe.objects.filter(
+            pk__in=self.get_flags_ids()
+        ).with_user_flags(request.user).only('id', 'author_id')
+        serializer = RecipeUserFlagsSerializer(recipes, many=True)
+        return Response(data=serializer.data)
+
+    def get_pantry(self):
+        """
+        Ингредиенты пользователя из параметра ingredients (id, параметр
+        повторяется) и допустимое число недостающих ингредиентов рецепта.
+        """
+        pantry = parse_query_param(
+            self.request, PANTRY_INGREDIENTS_PARAM, ListField(
+                child=IntegerField(min_value=1),
+                allow_empty=False,
+                max_length=PANTRY_MAX_INGREDIENTS
+            )
+        )
+        max_missing = parse_query_param(
+            self.request, PANTRY_MAX_MISSING_PARAM, IntegerField(min_value=0)
+        )
+        return set(pantry), max_missing
+
+    @action(
+        methods=('get',),
+        detail=False
+    )
+    def pantry(self, request):
+        """
+        Рецепты, которые можно приготовить из ингредиентов пользователя:
+        сначала те, для которых не хватает меньше всего ингредиентов,
+        с перечнем недостающих. Остальные фильтры списка рецептов
+        (теги, автор, поиск) тоже применяются.
+        """
+        pantry, max_missing = self.get_pantry()
+        queryset = self.filter_queryset(
+            Recipe.objects.for_feed(request.user)
+        ).with_pantry(pantry)
+        if max_missing is not None:
+            queryset = queryset.filter(
+                missing_ingredients_count__lte=max_missing
+            )
+        page = self.paginate_queryset(queryset)
+        serializer = PantryRecipeSerializer(
+            page,
+            many=True,
+            context={**self.get_serializer_context(), 'pantry': pantry}
+        )
+        return self.get_paginated_response(serializer.data)
+
     @action(
         methods=('post', 'delete'),
         detail=True
@@ -165,6 +537,20 @@ class RecipeViewSet(AddRemoveMixin, ModelViewSet):
             request.data['recipe'] = id
         return self.add_remove_action(request, context)
 
+    @action(
+        methods=('get',),
+        detail=False,
+        permission_classes=(IsActive,)
+    )
+    def shopping_cart_summary(self, request):
+        ingredients = request.user.shopping_list.select_related(
+            'ingredient'
+        ).order_by('ingredient__name')
+        serializer = ShoppingCartIngredientSerializer(
+            instance=ingredients, many=True
+        )
+        return Response(data=serializer.data)
+
     @action(
         methods=('get',),
         detail=False,
@@ -172,30 +558,42 @@ class RecipeViewSet(AddRemoveMixin, ModelViewSet):
     )
     def download_shopping_cart(self, request):
         user = request.user
-        if not user.shops_for.exists():
+        file_format = request.query_params.get(
+            SHOPPING_CART_FORMAT_PARAM, SHOPPING_CART_DEFAULT_FORMAT
+        )
+        renderer = get_renderer(file_format)
+        if renderer is None:
+            return Response(
+                data={SHOPPING_CART_FORMAT_PARAM: [
+                    f'Доступные форматы: '
+                    f'{", ".join(SHOPPING_CART_RENDERERS)}.'
+                ]},
+                status=HTTP_400_BAD_REQUEST
+            )
+        ingredients = user.shopping_list.values(
+            'ingredient__name', 'ingredient__measurement_unit', 'amount'
+        ).order_by('ingredient__name')
+        etag = get_etag(
+            f'{user.id}-{file_format}',
+            ingredients.iterator(chunk_size=SHOPPING_CART_CHUNK_SIZE)
+        )
+        if etag is None:
             return Response(
                 data={"detail": "Ваш список покупок пуст."},
                 status=HTTP_400_BAD_REQUEST
                 )
-        ingredients = IngredientInRecipe.objects.filter(
-            recipe__shopped_by__user=user
-        ).values(
-            'ingredient__name', 'ingredient__measurement_unit'
-        ).annotate(amount=Sum('amount'))
-        text = 'ВАШ СПИСОК ПОКУПОК: \n\n'
-        text += '\n'.join([
-            f"\u2022 {ingredient['ingredient__name']}"
-            f" ({ingredient['ingredient__measurement_unit']})"
-            f" -- {ingredient['amount']}"
-            for ingredient in ingredients
-        ])
-        text += '\n\nFOODGRAM'
-        filename = f'{user.get_username()}_shopping_cart.txt'
-        response = HttpResponse(
-            content=text.encode(encoding=DEFAULT_CHARSET),
-            content_type=(
-                f'{SHOPPING_CART_CONTENT_TYPE}; charset={DEFAULT_CHARSET}'
-            )
+        not_modified = get_conditional_response(request, etag=etag)
+        if not_modified is not None:
+            return not_modified
+        filename = (
+            f'{user.get_username()}_shopping_cart.{renderer.extension}'
+        )
+        response = StreamingHttpResponse(
+            streaming_content=renderer.render(
+                ingredients.iterator(chunk_size=SHOPPING_CART_CHUNK_SIZE)
+            ),
+            content_type=renderer.content_type
         )
         response['Content-Disposition'] = f'attachment; filename={filename}'
+        response['ETag'] = etag
         return response
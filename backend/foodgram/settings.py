@@ -78,6 +78,24 @@ DATABASES = {
     }
 }
 
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            key='CACHE_BACKEND',
+            default='django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv(key='CACHE_LOCATION', default='foodgram'),
+    }
+}
+
+SHARED_CACHE_BACKENDS = (
+    'django.core.cache.backends.redis.RedisCache',
+    'django.core.cache.backends.memcached.PyMemcacheCache',
+    'django.core.cache.backends.memcached.PyLibMCCache',
+)
+
+SHARED_CACHE = CACHES['default']['BACKEND'] in SHARED_CACHE_BACKENDS
+
 AUTH_USER_MODEL = 'users.User'
 
 AUTH_PASSWORD_VALIDATORS = [
@@ -124,7 +142,7 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'api.permissions.IsActiveOrReadOnly',
@@ -152,4 +170,109 @@ MIN_INGREDIENT_AMOUNT = 1
 
 MIN_COOKING_TIME = 1
 
+RECIPES_LIMIT_PARAM = 'recipes_limit'
+
+RECIPE_PAGINATION_PARAM = 'pagination'
+
+RECIPE_PAGINATION_HEADER = 'X-Pagination'
+
+RECIPE_PAGINATION_CURSOR = 'cursor'
+
+INGREDIENT_SEARCH_LIMIT = 20
+
+INGREDIENTS_DATA_PATH = os.getenv(
+    key='INGREDIENTS_DATA_PATH',
+    default=os.path.join(BASE_DIR.parent, 'data', 'ingredients.csv')
+)
+
+INGREDIENTS_LOAD_BATCH_SIZE = 1000
+
+RECIPE_PUBLIC_PARAM = 'public'
+
+RECIPE_FLAGS_IDS_PARAM = 'ids'
+
+RECIPE_FLAGS_MAX_IDS = 100
+
+PANTRY_INGREDIENTS_PARAM = 'ingredients'
+
+PANTRY_MAX_MISSING_PARAM = 'max_missing'
+
+PANTRY_MAX_INGREDIENTS = 100
+
+CATALOG_TTL = 300
+
+RESPONSE_CACHE_ENABLED = os.getenv(
+    key='RESPONSE_CACHE_ENABLED', default='True'
+) == 'True'
+
+RESPONSE_CACHE_TTL = 300
+
+EDGE_CACHE_MAX_AGE = int(os.getenv(key='EDGE_CACHE_MAX_AGE', default=30))
+
+AUTH_TOKEN_CACHE_TTL = int(os.getenv(
+    key='AUTH_TOKEN_CACHE_TTL',
+    default=60 if SHARED_CACHE else 0
+))
+
 SHOPPING_CART_CONTENT_TYPE = 'text/plain'
+
+SHOPPING_CART_FORMAT_PARAM = 'file_format'
+
+SHOPPING_CART_DEFAULT_FORMAT = 'txt'
+
+SHOPPING_CART_RENDERERS = {
+    'txt': 'api.shopping_cart.TextRenderer',
+    'csv': 'api.shopping_cart.CSVRenderer',
+    'json': 'api.shopping_cart.JSONRenderer',
+    'pdf': 'api.shopping_cart.PDFRenderer',
+}
+
+SHOPPING_CART_CHUNK_SIZE = 500
+
+SHOPPING_CART_PDF_FONT = os.getenv(
+    key='SHOPPING_CART_PDF_FONT',
+    default='/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf'
+)
+
+RECIPE_IMAGE_MAX_SIZE = int(os.getenv(
+    key='RECIPE_IMAGE_MAX_SIZE',
+    default=10 * 1024 * 1024
+))
+
+DATA_UPLOAD_MAX_MEMORY_SIZE = RECIPE_IMAGE_MAX_SIZE * 4 // 3 + 1024 * 1024
+
+FILE_UPLOAD_MAX_MEMORY_SIZE = 2621440
+
+RECIPE_IMAGE_DECODE_CHUNK_SIZE = 64 * 1024
+
+RECIPE_IMAGE_FORMAT = 'WEBP'
+
+RECIPE_IMAGE_FALLBACK_FORMAT = 'JPEG'
+
+RECIPE_IMAGE_QUALITY = 80
+
+RECIPE_IMAGE_VARIANTS = {
+    'thumbnail': (160, 160),
+    'card': (480, 480),
+    'full': (1280, 1280),
+}
+
+RECIPE_IMAGE_RENDITIONS = {
+    'small': (100, 100),
+    'medium': (240, 240),
+}
+
+RECIPE_IMAGE_RENDITIONS_DIR = 'renditions'
+
+RECIPE_IMAGE_RENDITIONS_MAX_SIZE = int(os.getenv(
+    key='RECIPE_IMAGE_RENDITIONS_MAX_SIZE',
+    default=512 * 1024 * 1024
+))
+
+RECIPE_IMAGE_RENDITIONS_TOUCH_INTERVAL = 60
+
+RECIPE_IMAGE_SIZE_PARAM = 'image_size'
+
+RECIPE_IMAGE_ASYNC = os.getenv(
+    key='RECIPE_IMAGE_ASYNC', default='True'
+) == 'True'
@@ -1,7 +1,8 @@
 from django.contrib.admin import ModelAdmin, TabularInline, display, register
 
+from api.response_cache import RECIPES_TAG, recipe_tag, response_cache
 from recipes.models import (Favorite, Ingredient, IngredientInRecipe, Recipe,
-                            ShoppingCart, Tag)
+                            ShoppingCart, ShoppingCartIngredient, Tag)
 
 
 @register(Tag)
@@ -30,9 +31,18 @@ class RecipeAdmin(ModelAdmin):
     search_fields = ('name', 'author__username', 'author__email')
     list_filter = ('tags__name',)
 
-    @display(description='В избранных (кол-во раз)')
+    @display(
+        description='В избранных (кол-во раз)',
+        ordering='favorites_count'
+    )
     def added_to_favorite(self, obj):
-        return obj.favorited_by.count()
+        return obj.favorites_count
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        Recipe.objects.filter(
+            pk=form.instance.pk
+        ).update_ingredients_count()
 
 
 @register(IngredientInRecipe)
@@ -44,6 +54,33 @@ class IngredientInRecipeAdmin(ModelAdmin):
     )
     list_filter = ('recipe__tags__name',)
 
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        recipe_ids = {obj.recipe_id}
+        if change and 'recipe' in form.changed_data:
+            recipe_ids.add(form.initial['recipe'])
+        self.update_recipes(recipe_ids)
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        self.update_recipes({obj.recipe_id})
+
+    def delete_queryset(self, request, queryset):
+        recipe_ids = set(queryset.values_list('recipe_id', flat=True))
+        super().delete_queryset(request, queryset)
+        self.update_recipes(recipe_ids)
+
+    def update_recipes(self, recipe_ids):
+        """
+        Пересчитывает число ингредиентов рецептов и сбрасывает их
+        кешированные ответы API: ингредиенты здесь меняются без сохранения
+        рецепта.
+        """
+        Recipe.objects.filter(pk__in=recipe_ids).update_ingredients_count()
+        response_cache.invalidate_on_commit(
+            RECIPES_TAG, *map(recipe_tag, recipe_ids)
+        )
+
 
 @register(Favorite)
 class FavoriteAdmin(ModelAdmin):
@@ -57,3 +94,10 @@ class ShoppingCartAdmin(ModelAdmin):
     list_display = ('user', 'recipe')
     search_fields = ('user__username', 'user__email', 'recipe__name')
     list_filter = ('recipe__tags__name',)
+
+
+@register(ShoppingCartIngredient)
+class ShoppingCartIngredientAdmin(ModelAdmin):
+    list_display = ('user', 'ingredient', 'amount')
+    search_fields = ('user__username', 'user__email', 'ingredient__name')
+    list_select_related = ('user', 'ingredient')
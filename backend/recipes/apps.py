@@ -1,6 +1,16 @@
 from django.apps import AppConfig
+from django.db import connections
+from django.db.models.signals import post_migrate
+
+
+def restore_search(using, **kwargs):
+    from recipes.search import restore_search_triggers
+    restore_search_triggers(connections[using])
 
 
 class RecipesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'recipes'
+
+    def ready(self):
+        post_migrate.connect(restore_search, sender=self)
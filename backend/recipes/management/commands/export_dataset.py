@@ -0,0 +1,41 @@
+import sys
+import time
+from collections import Counter
+
+from django.core.management import BaseCommand
+
+from recipes.management.dataset import dump_record, export_records
+
+
+class Command(BaseCommand):
+    help = (
+        'Выгрузка пользователей, подписок, тегов, ингредиентов, рецептов '
+        'с ингредиентами, избранного и корзин в файл JSON Lines для '
+        'команды import_dataset. Файлы картинок не выгружаются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', help='Путь к файлу или - для вывода в stdout.'
+        )
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        counts = Counter()
+        path = options['path']
+        if path == '-':
+            self.write(sys.stdout, options['chunk_size'], counts)
+            return
+        with open(path, 'w', encoding='utf-8') as file:
+            self.write(file, options['chunk_size'], counts)
+        self.stdout.write(self.style.SUCCESS(
+            f'Выгружено в {path} за {time.perf_counter() - started:.2f} с: '
+            + ', '.join(f'{key} {value}' for key, value in counts.items())
+        ))
+
+    def write(self, file, chunk_size, counts):
+        for record in export_records(chunk_size):
+            counts[record['type']] += 1
+            file.write(dump_record(record))
+        del counts['header']
@@ -0,0 +1,295 @@
+import itertools
+import random
+import time
+from bisect import bisect_left
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from api.management.benchmark import make_image
+from recipes.management.dataset import finish_bulk_load
+from recipes.models import (Favorite, Ingredient, IngredientInRecipe, Recipe,
+                            ShoppingCart, Tag)
+from users.models import Follow
+
+User = get_user_model()
+
+FAKE_IMAGE = 'recipes/fake.png'
+
+
+class PowerLawSampler:
+    """
+    Выбор элементов с вероятностью, убывающей по степенному закону
+    от их места в списке: первые элементы выбираются намного чаще
+    остальных, как популярные авторы и рецепты.
+    """
+    def __init__(self, items, exponent, rnd):
+        self.items = items
+        self.rnd = rnd
+        self.cum_weights = list(itertools.accumulate(
+            1 / (rank ** exponent) for rank in range(1, len(items) + 1)
+        ))
+
+    def sample(self, count, exclude=None):
+        """До count различных элементов, кроме exclude."""
+        count = min(count, len(self.items) - (exclude is not None))
+        chosen = set()
+        total = self.cum_weights[-1]
+        for _ in range(count * 10):
+            if len(chosen) >= count:
+                break
+            item = self.items[bisect_left(
+                self.cum_weights, self.rnd.random() * total
+            )]
+            if item != exclude:
+                chosen.add(item)
+        return chosen
+
+
+class Command(BaseCommand):
+    help = (
+        'Создание синтетических данных для нагрузочных замеров: '
+        'пользователей, подписок (число подписчиков распределено '
+        'по степенному закону), тегов, рецептов с ингредиентами из '
+        'справочника, избранного и корзин. При одинаковом --seed данные '
+        'одинаковы.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--recipes', type=int, default=10000)
+        parser.add_argument('--tags', type=int, default=10)
+        parser.add_argument(
+            '--max-recipe-ingredients', type=int, default=10
+        )
+        parser.add_argument(
+            '--follows', type=int, default=10,
+            help='Среднее число подписок пользователя.'
+        )
+        parser.add_argument(
+            '--favorites', type=int, default=20,
+            help='Среднее число рецептов в избранном пользователя.'
+        )
+        parser.add_argument(
+            '--carts', type=int, default=3,
+            help='Среднее число рецептов в корзине пользователя.'
+        )
+        parser.add_argument(
+            '--exponent', type=float, default=1.1,
+            help='Показатель степенного закона популярности.'
+        )
+        parser.add_argument(
+            '--days', type=int, default=365,
+            help='За сколько последних дней распределить даты рецептов.'
+        )
+        parser.add_argument(
+            '--password',
+            help=(
+                'Пароль пользователей; без него пользователи не могут '
+                'войти.'
+            )
+        )
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        ingredient_ids = list(
+            Ingredient.objects.order_by('pk').values_list('pk', flat=True)
+        )
+        if not ingredient_ids:
+            raise CommandError(
+                'Справочник ингредиентов пуст, сначала выполните '
+                'load_ingredients.'
+            )
+        self.prefix = f'fake{options["seed"]}_'
+        if User.objects.filter(username__startswith=self.prefix).exists():
+            raise CommandError(
+                f'Данные с --seed {options["seed"]} уже созданы.'
+            )
+        self.rnd = random.Random(options['seed'])
+        self.options = options
+        self.batch_size = options['batch_size']
+        self.counts = {}
+        started = time.perf_counter()
+        for step, method, args in (
+            ('пользователи', self.create_users, ()),
+            ('теги', self.create_tags, ()),
+            ('рецепты', self.create_recipes, (ingredient_ids,)),
+            ('подписки', self.create_follows, ()),
+            ('избранное и корзины', self.create_marks, ()),
+            ('счётчики и списки покупок', self.finish, ()),
+        ):
+            step_started = time.perf_counter()
+            method(*args)
+            self.stdout.write(
+                f'{step}: {time.perf_counter() - step_started:.2f} с'
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'Данные созданы за {time.perf_counter() - started:.2f} с: '
+            + ', '.join(
+                f'{name} {count}' for name, count in self.counts.items()
+            )
+        ))
+
+    def bulk_create(self, model, objects, label):
+        """
+        Вставка пачками по batch_size без накопления всех объектов
+        в памяти; возвращает id созданных записей.
+        """
+        created = []
+        iterator = iter(objects)
+        while True:
+            batch = list(itertools.islice(iterator, self.batch_size))
+            if not batch:
+                break
+            created.extend(
+                obj.pk for obj in model.objects.bulk_create(batch)
+            )
+        self.counts[label] = self.counts.get(label, 0) + len(created)
+        return created
+
+    def get_ranked(self, ids):
+        """id в случайном порядке, задающем их популярность."""
+        ids = list(ids)
+        self.rnd.shuffle(ids)
+        return ids
+
+    def create_users(self):
+        password = make_password(self.options['password'])
+        self.user_ids = self.bulk_create(User, (
+            User(
+                username=f'{self.prefix}{i}',
+                email=f'{self.prefix}{i}@foodgram.test',
+                first_name=f'Имя{i}',
+                last_name=f'Фамилия{i}',
+                password=password
+            )
+            for i in range(self.options['users'])
+        ), 'пользователей')
+
+    def create_tags(self):
+        existing = list(Tag.objects.values_list('pk', flat=True))
+        missing = self.options['tags'] - len(existing)
+        created = self.bulk_create(Tag, (
+            Tag(
+                name=f'{self.prefix}тег {i}',
+                color='#{:06X}'.format(self.rnd.randrange(0x1000000)),
+                slug=f'{self.prefix}tag{i}'
+            )
+            for i in range(max(missing, 0))
+        ), 'тегов')
+        self.tag_ids = existing + created
+
+    def create_recipes(self, ingredient_ids):
+        """
+        Рецепты вставляются пачками; для каждой пачки сразу создаются их
+        теги и ингредиенты, так что в памяти не больше одной пачки.
+        """
+        if not default_storage.exists(FAKE_IMAGE):
+            default_storage.save(FAKE_IMAGE, ContentFile(make_image()))
+        rnd = self.rnd
+        authors = PowerLawSampler(
+            self.get_ranked(self.user_ids), self.options['exponent'], rnd
+        )
+        now = timezone.now()
+        period = timedelta(days=self.options['days']).total_seconds()
+        max_ingredients = self.options['max_recipe_ingredients']
+        max_tags = min(3, len(self.tag_ids))
+        self.recipe_ids = []
+        for start in range(0, self.options['recipes'], self.batch_size):
+            count = min(self.batch_size, self.options['recipes'] - start)
+            recipe_ingredients = [
+                rnd.sample(ingredient_ids, rnd.randint(
+                    1, min(max_ingredients, len(ingredient_ids))
+                ))
+                for _ in range(count)
+            ]
+            recipes = [
+                Recipe(
+                    author_id=authors.sample(1).pop(),
+                    name=f'Рецепт {start + i}',
+                    image=FAKE_IMAGE,
+                    text=f'Описание рецепта {start + i}',
+                    cooking_time=rnd.randint(1, 180),
+                    ingredients_count=len(recipe_ingredients[i])
+                )
+                for i in range(count)
+            ]
+            with transaction.atomic():
+                recipes = Recipe.objects.bulk_create(recipes)
+                # bulk_create записывает в pub_date текущее время, даты
+                # публикации разносятся по периоду отдельным запросом.
+                for recipe in recipes:
+                    recipe.pub_date = now - timedelta(
+                        seconds=rnd.random() * period
+                    )
+                Recipe.objects.bulk_update(
+                    recipes, ('pub_date',), batch_size=500
+                )
+                self.bulk_create(Recipe.tags.through, (
+                    Recipe.tags.through(recipe_id=recipe.pk, tag_id=tag_id)
+                    for recipe in recipes
+                    for tag_id in rnd.sample(
+                        self.tag_ids, rnd.randint(min(1, max_tags), max_tags)
+                    )
+                ), 'тегов рецептов')
+                self.bulk_create(IngredientInRecipe, (
+                    IngredientInRecipe(
+                        recipe_id=recipe.pk,
+                        ingredient_id=ingredient_id,
+                        amount=rnd.randint(1, 500)
+                    )
+                    for recipe, ingredients in zip(
+                        recipes, recipe_ingredients
+                    )
+                    for ingredient_id in ingredients
+                ), 'ингредиентов рецептов')
+            self.recipe_ids.extend(recipe.pk for recipe in recipes)
+        self.counts['рецептов'] = len(self.recipe_ids)
+
+    def get_count(self, average):
+        """Число связей пользователя, в среднем равное average."""
+        return min(int(self.rnd.expovariate(1 / average)), average * 20)
+
+    def create_follows(self):
+        if self.options['follows'] <= 0:
+            return
+        followees = PowerLawSampler(
+            self.get_ranked(self.user_ids), self.options['exponent'], self.rnd
+        )
+        self.bulk_create(Follow, (
+            Follow(follower_id=follower_id, followee_id=followee_id)
+            for follower_id in self.user_ids
+            for followee_id in followees.sample(
+                self.get_count(self.options['follows']),
+                exclude=follower_id
+            )
+        ), 'подписок')
+
+    def create_marks(self):
+        if not self.recipe_ids:
+            return
+        recipes = PowerLawSampler(
+            self.get_ranked(self.recipe_ids), self.options['exponent'],
+            self.rnd
+        )
+        for model, average, label in (
+            (Favorite, self.options['favorites'], 'в избранном'),
+            (ShoppingCart, self.options['carts'], 'в корзинах'),
+        ):
+            if average <= 0:
+                continue
+            self.bulk_create(model, (
+                model(user_id=user_id, recipe_id=recipe_id)
+                for user_id in self.user_ids
+                for recipe_id in recipes.sample(self.get_count(average))
+            ), label)
+
+    def finish(self):
+        finish_bulk_load(self.user_ids, self.batch_size)
@@ -0,0 +1,75 @@
+import os
+import time
+
+from django.core.management import BaseCommand, CommandError
+
+from recipes.management.dataset import DatasetImporter
+
+STATS_LABELS = {
+    'created': 'добавлено',
+    'existing': 'уже было',
+    'skipped': 'пропущено без связанных записей',
+    'conflicts': 'пропущено из-за занятых уникальных значений',
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Загрузка данных, выгруженных командой export_dataset. Записи '
+        'вставляются пачками, id связанных записей заменяются на новые. '
+        'Прерванная загрузка продолжается с последней сохранённой пачки '
+        'при повторном запуске с тем же файлом, повторный запуск после '
+        'завершённой загрузки ничего не добавляет.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--state',
+            help=(
+                'Файл состояния загрузки, по умолчанию - путь к файлу '
+                'данных с расширением .state.'
+            )
+        )
+        parser.add_argument(
+            '--restart',
+            action='store_true',
+            help='Начать загрузку заново, не используя файл состояния.'
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        state_path = options['state'] or f'{path}.state'
+        if options['restart'] and os.path.exists(state_path):
+            os.remove(state_path)
+        started = time.perf_counter()
+        try:
+            with open(state_path, 'a+', encoding='utf-8') as state_file:
+                state_file.seek(0)
+                importer = DatasetImporter(options['batch_size'], state_file)
+                importer.restore(state_file)
+                if importer.resume_line:
+                    self.stdout.write(
+                        f'Загрузка продолжается со строки '
+                        f'{importer.resume_line + 1}.'
+                    )
+                with open(path, encoding='utf-8') as file:
+                    stats = importer.run(file)
+        except OSError as error:
+            raise CommandError(f'Не удалось прочитать {path}: {error}')
+        except (ValueError, KeyError, TypeError) as error:
+            raise CommandError(f'Некорректные данные в {path}: {error}')
+        for conflict in importer.conflicts:
+            self.stderr.write(self.style.WARNING(conflict))
+        self.stdout.write(self.style.SUCCESS(
+            f'Данные загружены из {path} за '
+            f'{time.perf_counter() - started:.2f} с.'
+        ))
+        for record_type, counts in stats.items():
+            self.stdout.write(
+                f'{record_type}: ' + ', '.join(
+                    f'{STATS_LABELS[key]} {value}'
+                    for key, value in counts.items()
+                )
+            )
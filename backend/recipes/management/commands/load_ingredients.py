@@ -1,26 +1,159 @@
 import csv
+import json
+import os
+import time
 
-from django.core.management import BaseCommand
+from django.core.management import BaseCommand, CommandError
+from django.db import transaction
 
+from api.catalog import ingredient_catalog
+from api.response_cache import RECIPES_TAG, ingredient_tag, response_cache
+from foodgram.settings import (INGREDIENTS_DATA_PATH,
+                               INGREDIENTS_LOAD_BATCH_SIZE)
 from recipes.models import Ingredient
 
+FORMATS = ('csv', 'json', 'jsonl')
+
+NAME_MAX_LENGTH = Ingredient._meta.get_field('name').max_length
+
+UNIT_MAX_LENGTH = Ingredient._meta.get_field('measurement_unit').max_length
+
+
+def read_csv(file):
+    for row in csv.reader(file):
+        if len(row) != 2:
+            yield None, None
+            continue
+        yield row
+
+
+def read_json(file):
+    for item in json.load(file):
+        yield item.get('name'), item.get('measurement_unit')
+
+
+def read_jsonl(file):
+    for line in file:
+        if line.strip():
+            item = json.loads(line)
+            yield item.get('name'), item.get('measurement_unit')
+
+
+READERS = {'csv': read_csv, 'json': read_json, 'jsonl': read_jsonl}
+
 
 class Command(BaseCommand):
-    help = 'Загрузка ингредиентов из ingredients.csv'
+    help = (
+        'Загрузка ингредиентов из файла CSV (название, единица измерения), '
+        'JSON (список объектов с полями name и measurement_unit) или JSON '
+        'Lines. Новые ингредиенты добавляются, у существующих обновляется '
+        'единица измерения; повторная загрузка того же файла ничего '
+        'не меняет.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path',
+            nargs='?',
+            default=INGREDIENTS_DATA_PATH,
+            help='Путь к файлу, по умолчанию INGREDIENTS_DATA_PATH.'
+        )
+        parser.add_argument(
+            '--format',
+            choices=FORMATS,
+            help='Формат файла, по умолчанию - по расширению.'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=INGREDIENTS_LOAD_BATCH_SIZE
+        )
 
     def handle(self, *args, **options):
-        with open(
-            file='../data/ingredients.csv',
-            newline='',
-            encoding='utf-8'
-        ) as f:
-            reader = csv.reader(f)
-            for row in reader:
-                name, measurement_unit = row
-                Ingredient.objects.get_or_create(
-                    name__iexact=name,
-                    defaults={
-                        'name': name,
-                        'measurement_unit': measurement_unit
-                    }
+        path = options['path']
+        file_format = options['format'] or (
+            os.path.splitext(path)[1].lstrip('.').lower()
+        )
+        if file_format not in READERS:
+            raise CommandError(
+                f'Неизвестный формат файла {path}, укажите --format.'
+            )
+        started = time.perf_counter()
+        try:
+            with open(path, newline='', encoding='utf-8') as file:
+                stats = self.load(
+                    READERS[file_format](file), options['batch_size']
                 )
+        except OSError as error:
+            raise CommandError(f'Не удалось прочитать {path}: {error}')
+        except (ValueError, AttributeError) as error:
+            raise CommandError(f'Некорректные данные в {path}: {error}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Ингредиенты загружены из {path} за '
+            f'{time.perf_counter() - started:.2f} с: '
+            f'добавлено {stats["created"]}, обновлено {stats["updated"]}, '
+            f'без изменений {stats["unchanged"]}, '
+            f'повторов {stats["duplicates"]}, с ошибками {stats["invalid"]}.'
+        ))
+
+    @transaction.atomic
+    def load(self, rows, batch_size):
+        """Записывает новые и изменённые ингредиенты пачками."""
+        existing = {
+            name.casefold(): (name, measurement_unit, pk)
+            for pk, name, measurement_unit in Ingredient.objects.values_list(
+                'pk', 'name', 'measurement_unit'
+            ).iterator()
+        }
+        stats = dict.fromkeys(
+            ('created', 'updated', 'unchanged', 'duplicates', 'invalid'), 0
+        )
+        changes = []
+        updated_ids = []
+        seen = set()
+        for name, measurement_unit in rows:
+            name = (name or '').strip()
+            measurement_unit = (measurement_unit or '').strip()
+            if not (
+                name and measurement_unit and
+                len(name) <= NAME_MAX_LENGTH and
+                len(measurement_unit) <= UNIT_MAX_LENGTH
+            ):
+                stats['invalid'] += 1
+                continue
+            key = name.casefold()
+            if key in seen:
+                stats['duplicates'] += 1
+                continue
+            seen.add(key)
+            if key not in existing:
+                stats['created'] += 1
+            elif existing[key][1] != measurement_unit:
+                name = existing[key][0]
+                updated_ids.append(existing[key][2])
+                stats['updated'] += 1
+            else:
+                stats['unchanged'] += 1
+                continue
+            changes.append(Ingredient(
+                name=name, measurement_unit=measurement_unit
+            ))
+        Ingredient.objects.bulk_create(
+            changes,
+            batch_size=batch_size,
+            update_conflicts=True,
+            unique_fields=('name',),
+            update_fields=('measurement_unit',)
+        )
+        if changes:
+            transaction.on_commit(ingredient_catalog.bump)
+        if updated_ids:
+            self.invalidate(updated_ids)
+        return stats
+
+    def invalidate(self, ingredient_ids):
+        """
+        Сбрасывает кешированные ответы с изменёнными ингредиентами после
+        коммита: массовая вставка не вызывает сигналы моделей.
+        """
+        response_cache.invalidate_on_commit(
+            RECIPES_TAG, *map(ingredient_tag, ingredient_ids)
+        )
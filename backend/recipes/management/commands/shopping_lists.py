@@ -0,0 +1,60 @@
+from django.core.management import BaseCommand, CommandError
+
+from recipes.models import ShoppingCartIngredient
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересборка сводных списков покупок по корзинам пользователей '
+        'или проверка их соответствия корзинам (--verify).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify',
+            action='store_true',
+            help='Только сравнить списки с корзинами, ничего не меняя.'
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        if not options['verify']:
+            created = ShoppingCartIngredient.objects.rebuild(
+                batch_size=options['batch_size']
+            )
+            self.stdout.write(self.style.SUCCESS(
+                f'Списки покупок пересобраны, строк: {created}.'
+            ))
+            return
+        self.verify({
+            (row['user_id'], row['recipe__recipe_ingredients__ingredient_id']):
+            row['total']
+            for row in ShoppingCartIngredient.objects.calculate().iterator()
+        })
+
+    def verify(self, expected):
+        actual = {
+            (user_id, ingredient_id): amount
+            for user_id, ingredient_id, amount in (
+                ShoppingCartIngredient.objects.order_by().values_list(
+                    'user_id', 'ingredient_id', 'amount'
+                ).iterator()
+            )
+        }
+        mismatches = 0
+        for key in expected.keys() | actual.keys():
+            if expected.get(key) != actual.get(key):
+                mismatches += 1
+                user_id, ingredient_id = key
+                self.stdout.write(
+                    f'Пользователь {user_id}, ингредиент {ingredient_id}: '
+                    f'ожидается {expected.get(key)}, '
+                    f'записано {actual.get(key)}'
+                )
+        if mismatches:
+            raise CommandError(
+                f'Расхождений в списках покупок: {mismatches}.'
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'Списки покупок соответствуют корзинам, строк: {len(expected)}.'
+        ))
@@ -0,0 +1,355 @@
+import json
+from collections import defaultdict
+from datetime import datetime
+
+from django.contrib.auth import get_user_model
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Prefetch
+from django.db.models.fields.files import FieldFile
+
+from api.catalog import ingredient_catalog, tag_catalog
+from api.management.commands.recount_counters import recount_counters
+from api.response_cache import POPULARITY_TAG, RECIPES_TAG, response_cache
+from recipes.models import (Favorite, Ingredient, IngredientInRecipe, Recipe,
+                            ShoppingCart, ShoppingCartIngredient, Tag)
+from users.models import Follow
+
+User = get_user_model()
+
+FORMAT_NAME = 'foodgram'
+
+FORMAT_VERSION = 1
+
+# Тип записи: модель, поля со значениями, внешние ключи (поле: тип записи,
+# на которую оно ссылается). Записи выгружаются в этом порядке, чтобы при
+# загрузке запись шла после всех записей, на которые она ссылается.
+RECORD_TYPES = {
+    'user': (
+        User,
+        (
+            'username', 'email', 'first_name', 'last_name', 'password',
+            'is_active', 'is_staff', 'is_superuser', 'date_joined',
+            'last_login'
+        ),
+        {}
+    ),
+    'tag': (Tag, ('name', 'color', 'slug'), {}),
+    'ingredient': (Ingredient, ('name', 'measurement_unit'), {}),
+    'recipe': (
+        Recipe,
+        (
+            'name', 'image', 'image_variants', 'text', 'cooking_time',
+            'pub_date', 'updated_at'
+        ),
+        {'author': 'user'}
+    ),
+    'follow': (Follow, (), {'follower': 'user', 'followee': 'user'}),
+    'favorite': (Favorite, (), {'user': 'user', 'recipe': 'recipe'}),
+    'shopping_cart': (
+        ShoppingCart, ('added_at',), {'user': 'user', 'recipe': 'recipe'}
+    ),
+}
+
+# Поля, по которым запись сопоставляется с уже существующей в базе данных.
+# У рецептов нет уникальных полей, они сопоставляются по автору, названию
+# и дате публикации.
+NATURAL_KEYS = {
+    'user': ('username',),
+    'tag': ('slug',),
+    'ingredient': ('name',),
+    'recipe': ('author_id', 'name', 'pub_date'),
+}
+
+# Остальные уникальные поля: новая запись, совпадающая по ним с другой
+# записью, пропускается.
+UNIQUE_FIELDS = {'user': ('email',), 'tag': ('name', 'color')}
+
+# Типы записей, на которые ссылаются другие записи: соответствие их id
+# в файле и в базе данных сохраняется для продолжения загрузки.
+REFERENCED_TYPES = ('user', 'tag', 'ingredient', 'recipe')
+
+# Связи, уникальные по паре внешних ключей: уже существующие пары
+# не вставляются повторно.
+RELATION_TYPES = ('follow', 'favorite', 'shopping_cart')
+
+
+def finish_bulk_load(user_ids, batch_size):
+    """
+    Пересчитывает данные, которые при массовой вставке не обновляются
+    сигналами: счётчики рецептов и пользователей, сводные списки покупок
+    пользователей user_ids, версии справочников и кешированные списки
+    рецептов.
+    """
+    recount_counters()
+    tag_catalog.bump()
+    ingredient_catalog.bump()
+    response_cache.invalidate(RECIPES_TAG, POPULARITY_TAG)
+    ShoppingCartIngredient.objects.rebuild(user_ids, batch_size)
+
+
+def export_records(chunk_size):
+    """
+    Записи набора данных по одной, от справочников к связям. Модели
+    читаются итератором по chunk_size строк, ингредиенты и теги рецептов
+    подгружаются для каждой пачки рецептов отдельным запросом.
+    """
+    yield {'type': 'header', 'format': FORMAT_NAME, 'version': FORMAT_VERSION}
+    for record_type, (model, fields, foreign_keys) in RECORD_TYPES.items():
+        queryset = model.objects.order_by('pk')
+        if record_type == 'recipe':
+            queryset = queryset.prefetch_related(
+                Prefetch('tags', queryset=Tag.objects.only('id')),
+                Prefetch(
+                    'recipe_ingredients',
+                    queryset=IngredientInRecipe.objects.order_by().only(
+                        'recipe_id', 'ingredient_id', 'amount'
+                    )
+                )
+            )
+        for obj in queryset.iterator(chunk_size=chunk_size):
+            record = {'type': record_type, 'id': obj.pk}
+            for field in fields:
+                value = model._meta.get_field(field).value_from_object(obj)
+                if isinstance(value, FieldFile):
+                    value = value.name
+                record[field] = value
+            for field in foreign_keys:
+                record[field] = getattr(obj, f'{field}_id')
+            if record_type == 'recipe':
+                record['tags'] = [tag.id for tag in obj.tags.all()]
+                record['ingredients'] = [
+                    [item.ingredient_id, item.amount]
+                    for item in obj.recipe_ingredients.all()
+                ]
+            yield record
+
+
+def dump_record(record):
+    return json.dumps(
+        record, cls=DjangoJSONEncoder, ensure_ascii=False
+    ) + '\n'
+
+
+class DatasetImporter:
+    """Загрузка набора данных из файла JSON Lines с продолжением."""
+    def __init__(self, batch_size, state_file):
+        self.batch_size = batch_size
+        self.state_file = state_file
+        self.ids = defaultdict(dict)
+        self.stats = defaultdict(lambda: defaultdict(int))
+        self.conflicts = []
+        self.resume_line = 0
+
+    def restore(self, lines):
+        """Восстанавливает позицию и соответствие id из файла состояния."""
+        for line in lines:
+            state = json.loads(line)
+            self.resume_line = state['line']
+            self.ids[state['type']].update(
+                (source_id, target_id)
+                for source_id, target_id in state['ids']
+            )
+
+    def run(self, lines):
+        batch, batch_type, line_number = [], None, 0
+        for line_number, line in enumerate(lines, start=1):
+            if line_number <= self.resume_line or not line.strip():
+                continue
+            record = json.loads(line)
+            record_type = record.pop('type')
+            if record_type == 'header':
+                if record.get('format') != FORMAT_NAME:
+                    raise ValueError('Файл не является выгрузкой foodgram.')
+                continue
+            if record_type not in RECORD_TYPES:
+                raise ValueError(
+                    f'Строка {line_number}: неизвестный тип записи '
+                    f'{record_type}.'
+                )
+            if batch and (
+                record_type != batch_type or len(batch) >= self.batch_size
+            ):
+                self.flush(batch_type, batch, line_number - 1)
+                batch = []
+            batch_type = record_type
+            batch.append(record)
+        if batch:
+            self.flush(batch_type, batch, line_number)
+        self.finish()
+        return self.stats
+
+    def flush(self, record_type, records, line_number):
+        with transaction.atomic():
+            ids = self.insert(record_type, records)
+        if record_type in REFERENCED_TYPES:
+            self.ids[record_type].update(ids)
+        self.state_file.write(json.dumps({
+            'line': line_number,
+            'type': record_type,
+            'ids': list(ids.items()) if record_type in REFERENCED_TYPES
+            else [],
+        }) + '\n')
+        self.state_file.flush()
+
+    def resolve(self, record_type, records):
+        """
+        Заменяет во внешних ключах записей id из файла на id в базе данных;
+        записи со ссылками на отсутствующие записи пропускаются.
+        """
+        _, _, foreign_keys = RECORD_TYPES[record_type]
+        resolved = []
+        for record in records:
+            try:
+                for field, target_type in foreign_keys.items():
+                    record[f'{field}_id'] = self.ids[target_type][
+                        record.pop(field)
+                    ]
+            except KeyError:
+                self.stats[record_type]['skipped'] += 1
+                continue
+            resolved.append(record)
+        return resolved
+
+    def get_key(self, model, fields, values):
+        key = []
+        for field in fields:
+            value = values[field]
+            if not field.endswith('_id'):
+                value = model._meta.get_field(field).to_python(value)
+            if isinstance(value, datetime):
+                # В файле время записано с точностью до миллисекунд.
+                value = value.replace(
+                    microsecond=value.microsecond // 1000 * 1000
+                )
+            key.append(value)
+        return tuple(key)
+
+    def exclude_conflicts(self, record_type, records):
+        """
+        Пропускает записи, значения уникальных полей которых уже заняты
+        в базе данных или предыдущей записью пачки.
+        """
+        model = RECORD_TYPES[record_type][0]
+        for field in UNIQUE_FIELDS.get(record_type, ()):
+            taken = set(model.objects.filter(
+                **{f'{field}__in': [record[field] for record in records]}
+            ).values_list(field, flat=True))
+            accepted = []
+            for record in records:
+                if record[field] in taken:
+                    self.stats[record_type]['conflicts'] += 1
+                    self.conflicts.append(
+                        f'{record_type} {record["id"]}: значение '
+                        f'{field} {record[field]} уже занято.'
+                    )
+                    continue
+                taken.add(record[field])
+                accepted.append(record)
+            records = accepted
+        return records
+
+    def build(self, record_type, record):
+        model, fields, foreign_keys = RECORD_TYPES[record_type]
+        values = {
+            field: model._meta.get_field(field).to_python(record[field])
+            for field in fields if field in record
+        }
+        for field in foreign_keys:
+            values[f'{field}_id'] = record[f'{field}_id']
+        if record_type == 'recipe':
+            values['ingredients_count'] = sum(
+                ingredient_id in self.ids['ingredient']
+                for ingredient_id, _ in record.get('ingredients', ())
+            )
+        return model(**values)
+
+    def insert(self, record_type, records):
+        """
+        Вставляет новые записи и возвращает соответствие id из файла id
+        в базе данных.
+        """
+        model, fields, foreign_keys = RECORD_TYPES[record_type]
+        records = self.resolve(record_type, records)
+        stats = self.stats[record_type]
+        ids = {}
+        key = NATURAL_KEYS.get(record_type)
+        if key is not None:
+            keys = [self.get_key(model, key, record) for record in records]
+            existing = {
+                self.get_key(model, key, row): row['pk']
+                for row in model.objects.filter(**{
+                    f'{field}__in': {record_key[index] for record_key in keys}
+                    for index, field in enumerate(key)
+                    if not isinstance(keys[0][index], datetime)
+                }).values(*key, 'pk')
+            } if keys else {}
+            new_records = {}
+            for record, record_key in zip(records, keys):
+                if record_key in existing:
+                    ids[record['id']] = existing[record_key]
+                    stats['existing'] += 1
+                else:
+                    new_records.setdefault(record_key, record)
+            records = self.exclude_conflicts(
+                record_type, list(new_records.values())
+            )
+        elif record_type in RELATION_TYPES:
+            first, second = (f'{field}_id' for field in foreign_keys)
+            existing = set(model.objects.filter(**{
+                f'{first}__in': {record[first] for record in records},
+                f'{second}__in': {record[second] for record in records},
+            }).values_list(first, second))
+            new_records = {}
+            for record in records:
+                pair = (record[first], record[second])
+                if pair in existing:
+                    stats['existing'] += 1
+                else:
+                    new_records.setdefault(pair, record)
+            records = list(new_records.values())
+        objects = model.objects.bulk_create(
+            self.build(record_type, record) for record in records
+        )
+        stats['created'] += len(objects)
+        # bulk_create проставляет полям auto_now и auto_now_add текущее
+        # время, даты из файла возвращаются отдельным запросом.
+        auto_dates = [
+            field for field in fields
+            if getattr(model._meta.get_field(field), 'auto_now', False) or
+            getattr(model._meta.get_field(field), 'auto_now_add', False)
+        ]
+        if auto_dates and objects:
+            for obj, record in zip(objects, records):
+                for field in auto_dates:
+                    setattr(obj, field, model._meta.get_field(
+                        field
+                    ).to_python(record[field]))
+            model.objects.bulk_update(objects, auto_dates)
+        for obj, record in zip(objects, records):
+            ids[record['id']] = obj.pk
+        if record_type == 'recipe':
+            self.insert_recipe_relations(objects, records)
+        return ids
+
+    def insert_recipe_relations(self, recipes, records):
+        recipe_tags = []
+        recipe_ingredients = []
+        for recipe, record in zip(recipes, records):
+            for tag_id in record.get('tags', ()):
+                if tag_id in self.ids['tag']:
+                    recipe_tags.append(Recipe.tags.through(
+                        recipe_id=recipe.pk, tag_id=self.ids['tag'][tag_id]
+                    ))
+            for ingredient_id, amount in record.get('ingredients', ()):
+                if ingredient_id in self.ids['ingredient']:
+                    recipe_ingredients.append(IngredientInRecipe(
+                        recipe_id=recipe.pk,
+                        ingredient_id=self.ids['ingredient'][ingredient_id],
+                        amount=amount
+                    ))
+        Recipe.tags.through.objects.bulk_create(recipe_tags)
+        IngredientInRecipe.objects.bulk_create(recipe_ingredients)
+
+    def finish(self):
+        finish_bulk_load(self.ids['user'].values(), self.batch_size)
@@ -0,0 +1,20 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0009_recipe_pub_date_id_index'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql=(
+                'CREATE INDEX IF NOT EXISTS recipes_recipe_tags_tag_recipe '
+                'ON recipes_recipe_tags (tag_id, recipe_id);'
+            ),
+            reverse_sql=(
+                'DROP INDEX IF EXISTS recipes_recipe_tags_tag_recipe;'
+            ),
+        ),
+    ]
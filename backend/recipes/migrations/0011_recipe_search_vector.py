@@ -0,0 +1,30 @@
+# Generated by Django 4.2.1 on 2026-10-17 05:18
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+from recipes.search import install_search, uninstall_search
+
+
+def create_search_index(apps, schema_editor):
+    install_search(schema_editor.connection, rebuild=True)
+
+
+def drop_search_index(apps, schema_editor):
+    uninstall_search(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0010_recipe_tags_tag_recipe_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True, verbose_name='Поисковый вектор'),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
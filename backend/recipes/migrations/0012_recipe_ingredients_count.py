@@ -0,0 +1,36 @@
+# Generated by Django 4.2.1 on 2026-10-17 05:21
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_ingredients(apps, schema_editor):
+    Recipe = apps.get_model('recipes', 'Recipe')
+    IngredientInRecipe = apps.get_model('recipes', 'IngredientInRecipe')
+    Recipe.objects.update(ingredients_count=Coalesce(
+        Subquery(
+            IngredientInRecipe.objects.filter(
+                recipe_id=OuterRef('pk')
+            ).order_by().values('recipe_id').annotate(
+                count=Count('pk')
+            ).values('count')
+        ),
+        0
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0011_recipe_search_vector'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='ingredients_count',
+            field=models.PositiveSmallIntegerField(default=0, editable=False, verbose_name='Число ингредиентов'),
+        ),
+        migrations.RunPython(count_ingredients, migrations.RunPython.noop),
+    ]
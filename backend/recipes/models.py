@@ -1,12 +1,20 @@
 from colorfield.fields import ColorField
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MinValueValidator
-from django.db.models import (CASCADE, CharField, DateTimeField, ForeignKey,
-                              ImageField, ManyToManyField, Model,
-                              PositiveSmallIntegerField, SlugField, TextField,
-                              UniqueConstraint)
+from django.db import connections, transaction
+from django.db.models import (CASCADE, BooleanField, CharField, Count,
+                              DateTimeField, Exists, F, ForeignKey, ImageField,
+                              Index, JSONField, Manager, ManyToManyField,
+                              Model, OuterRef, PositiveIntegerField,
+                              PositiveSmallIntegerField, Prefetch, QuerySet,
+                              SlugField, Subquery, Sum, TextField,
+                              UniqueConstraint, Value)
+from django.db.models.functions import Coalesce
 
 from foodgram.settings import MIN_COOKING_TIME, MIN_INGREDIENT_AMOUNT
+from recipes.search import search_recipes
+from users.models import Follow
 
 User = get_user_model()
 
@@ -77,6 +85,106 @@ class Ingredient(Model):
         return f'{self.name} в {self.measurement_unit}'
 
 
+class RecipeQuerySet(QuerySet):
+    """
+    Набор запросов рецептов с заранее выбранными связанными объектами и
+    признаками текущего пользователя, чтобы сериализация страницы рецептов
+    не обращалась к базе данных для каждого рецепта.
+    """
+    def with_related(self):
+        return self.select_related('author').prefetch_related(
+            'tags',
+            Prefetch(
+                'recipe_ingredients',
+                queryset=IngredientInRecipe.objects.select_related(
+                    'ingredient'
+                )
+            )
+        )
+
+    def with_user_flags(self, user):
+        if not user.is_authenticated:
+            return self.annotate(
+                is_favorited=Value(False, output_field=BooleanField()),
+                is_in_shopping_cart=Value(False, output_field=BooleanField()),
+                is_author_subscribed=Value(False, output_field=BooleanField())
+            )
+        return self.annotate(
+            is_favorited=Exists(Favorite.objects.filter(
+                user=user, recipe=OuterRef('pk')
+            )),
+            is_in_shopping_cart=Exists(ShoppingCart.objects.filter(
+                user=user, recipe=OuterRef('pk')
+            )),
+            is_author_subscribed=Exists(Follow.objects.filter(
+                follower=user, followee=OuterRef('author')
+            ))
+        )
+
+    def for_feed(self, user):
+        return self.with_related().with_user_flags(user)
+
+    def with_tags(self, tag_ids, match_all=False):
+        """Рецепты с любым или, при match_all, со всеми тегами tag_ids."""
+        recipe_tags = self.model.tags.through.objects
+        tag_ids = set(tag_ids)
+        if not match_all or len(tag_ids) == 1:
+            return self.filter(Exists(recipe_tags.filter(
+                recipe_id=OuterRef('pk'), tag_id__in=tag_ids
+            )))
+        return self.filter(pk__in=recipe_tags.filter(
+            tag_id__in=tag_ids
+        ).values('recipe_id').annotate(
+            tags_count=Count('tag_id')
+        ).filter(tags_count=len(tag_ids)).values('recipe_id'))
+
+    def search(self, value):
+        return search_recipes(self, value, connections[self.db])
+
+    def popular(self):
+        """Рецепты от чаще добавляемых в избранное к реже."""
+        return self.order_by('-favorites_count', '-pub_date', '-id')
+
+    def update_ingredients_count(self):
+        """
+        Пересчитывает сохранённое число ингредиентов рецептов после
+        изменения их ингредиентов в обход сериализатора рецепта.
+        """
+        return self.update(ingredients_count=Coalesce(
+            Subquery(
+                IngredientInRecipe.objects.filter(
+                    recipe_id=OuterRef('pk')
+                ).order_by().values('recipe_id').annotate(
+                    count=Count('pk')
+                ).values('count')
+            ),
+            0
+        ))
+
+    def with_pantry(self, ingredient_ids):
+        """Рецепты с ингредиентами ingredient_ids, сначала самые полные."""
+        recipe_ingredients = IngredientInRecipe.objects.filter(
+            ingredient_id__in=set(ingredient_ids)
+        ).order_by()
+        return self.filter(
+            pk__in=recipe_ingredients.values('recipe_id')
+        ).annotate(
+            matched_ingredients_count=Subquery(
+                recipe_ingredients.filter(
+                    recipe_id=OuterRef('pk')
+                ).values('recipe_id').annotate(
+                    count=Count('pk')
+                ).values('count')
+            ),
+            missing_ingredients_count=(
+                F('ingredients_count') - F('matched_ingredients_count')
+            )
+        ).order_by(
+            'missing_ingredients_count', '-matched_ingredients_count',
+            '-pub_date'
+        )
+
+
 class Recipe(Model):
     """Модель рецепта."""
     author = ForeignKey(
@@ -100,6 +208,12 @@ class Recipe(Model):
         blank=False,
         null=False
     )
+    image_variants = JSONField(
+        verbose_name='Варианты картинки',
+        default=dict,
+        blank=True,
+        editable=False
+    )
     text = TextField(
         verbose_name='Описание',
         help_text='Введите описание.',
@@ -136,11 +250,48 @@ class Recipe(Model):
         auto_now_add=True,
         editable=False
     )
+    updated_at = DateTimeField(
+        verbose_name='Дата изменения',
+        auto_now=True,
+        editable=False
+    )
+    ingredients_count = PositiveSmallIntegerField(
+        verbose_name='Число ингредиентов',
+        default=0,
+        editable=False
+    )
+    favorites_count = PositiveIntegerField(
+        verbose_name='В избранном',
+        default=0,
+        editable=False
+    )
+    shopping_carts_count = PositiveIntegerField(
+        verbose_name='В корзинах',
+        default=0,
+        editable=False
+    )
+    search_vector = SearchVectorField(
+        verbose_name='Поисковый вектор',
+        null=True,
+        editable=False
+    )
+
+    objects = RecipeQuerySet.as_manager()
 
     class Meta:
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
         ordering = ('-pub_date',)
+        indexes = (
+            Index(
+                fields=('-pub_date', '-id'),
+                name='recipes_pub_date_id_idx'
+            ),
+            Index(
+                fields=('-favorites_count', '-pub_date', '-id'),
+                name='recipes_popular_idx'
+            ),
+        )
 
     def __str__(self):
         return f'{self.name}, автор {self.author}'
@@ -243,6 +394,11 @@ class ShoppingCart(Model):
         blank=False,
         null=False
     )
+    added_at = DateTimeField(
+        verbose_name='Дата добавления',
+        auto_now_add=True,
+        editable=False
+    )
 
     class Meta:
         verbose_name = 'Покупка'
@@ -255,3 +411,195 @@ class ShoppingCart(Model):
 
     def __str__(self):
         return f'{self.user.get_username()} купит {self.recipe.name}'
+
+
+class ShoppingCartIngredientManager(Manager):
+    """
+    Менеджер сводного списка покупок. Пересчитывает суммы ингредиентов
+    пользователей при изменении их корзин и рецептов, лежащих в корзинах;
+    вызывается обработчиками сигналов корзин, рецептов и их ингредиентов.
+    """
+    def calculate(self):
+        """Суммы ингредиентов, заново посчитанные по корзинам и рецептам."""
+        return ShoppingCart.objects.values(
+            'user_id', 'recipe__recipe_ingredients__ingredient_id'
+        ).annotate(
+            total=Sum('recipe__recipe_ingredients__amount')
+        ).filter(total__isnull=False).order_by()
+
+    def rebuild(self, user_ids=None, batch_size=1000):
+        """
+        Пересобирает списки покупок пользователей user_ids (по умолчанию -
+        всех) по их корзинам, пачками по batch_size пользователей или
+        строк. Возвращает число записанных строк.
+        """
+        if user_ids is None:
+            with transaction.atomic():
+                self.all().delete()
+                return len(self.bulk_create(
+                    self.build(self.calculate().iterator()),
+                    batch_size=batch_size
+                ))
+        created = 0
+        user_ids = list(user_ids)
+        for start in range(0, len(user_ids), batch_size):
+            chunk = user_ids[start:start + batch_size]
+            with transaction.atomic():
+                self.filter(user_id__in=chunk).delete()
+                created += len(self.bulk_create(
+                    self.build(self.calculate().filter(user_id__in=chunk)),
+                    batch_size=batch_size
+                ))
+        return created
+
+    def build(self, rows):
+        return (
+            self.model(
+                user_id=row['user_id'],
+                ingredient_id=row['recipe__recipe_ingredients__ingredient_id'],
+                amount=row['total']
+            )
+            for row in rows
+        )
+
+    def get_amounts(self, recipe_id):
+        return dict(
+            IngredientInRecipe.objects.filter(
+                recipe_id=recipe_id
+            ).order_by().values_list('ingredient_id', 'amount')
+        )
+
+    def get_shoppers(self, recipe_id):
+        return tuple(
+            ShoppingCart.objects.filter(
+                recipe_id=recipe_id
+            ).order_by().values_list('user_id', flat=True)
+        )
+
+    def lock_recipe(self, recipe_id):
+        """
+        Блокирует строку рецепта до конца транзакции: изменение
+        ингредиентов рецепта и добавление его в корзину выполняются
+        по очереди, и каждое видит результат другого.
+        """
+        list(Recipe.objects.select_for_update().filter(
+            pk=recipe_id
+        ).values_list('pk', flat=True))
+
+    def add_recipe(self, user_id, recipe_id):
+        with transaction.atomic(savepoint=False):
+            self.lock_recipe(recipe_id)
+            self.apply((user_id,), self.get_amounts(recipe_id))
+
+    def remove_recipe(self, user_id, recipe_id):
+        with transaction.atomic(savepoint=False):
+            self.lock_recipe(recipe_id)
+            self.apply((user_id,), {
+                ingredient_id: -amount
+                for ingredient_id, amount
+                in self.get_amounts(recipe_id).items()
+            })
+
+    def change_recipe(self, recipe_id, deltas):
+        """
+        Прибавляет изменения ингредиентов рецепта deltas ({id ингредиента:
+        изменение количества}) к спискам всех пользователей, у которых
+        рецепт в корзине.
+        """
+        deltas = {key: value for key, value in deltas.items() if value}
+        if not deltas:
+            return
+        with transaction.atomic(savepoint=False):
+            self.lock_recipe(recipe_id)
+            self.apply(self.get_shoppers(recipe_id), deltas)
+
+    def delete_recipe(self, recipe_id):
+        with transaction.atomic(savepoint=False):
+            self.lock_recipe(recipe_id)
+            self.apply(self.get_shoppers(recipe_id), {
+                ingredient_id: -amount
+                for ingredient_id, amount
+                in self.get_amounts(recipe_id).items()
+            })
+
+    def apply(self, user_ids, deltas):
+        """
+        Прибавляет к суммам ингредиентов пользователей user_ids изменения
+        deltas ({id ингредиента: изменение количества}). Строки
+        пользователей блокируются, чтобы параллельные запросы одного
+        пользователя не затирали суммы друг друга.
+        """
+        if not user_ids or not deltas:
+            return
+        with transaction.atomic(savepoint=False):
+            list(User.objects.select_for_update().filter(
+                id__in=user_ids
+            ).order_by().values_list('id', flat=True))
+            current = {
+                (user_id, ingredient_id): amount
+                for user_id, ingredient_id, amount in self.filter(
+                    user_id__in=user_ids, ingredient_id__in=deltas
+                ).order_by().values_list('user_id', 'ingredient_id', 'amount')
+            }
+            self.bulk_create(
+                (
+                    self.model(
+                        user_id=user_id,
+                        ingredient_id=ingredient_id,
+                        amount=max(
+                            current.get((user_id, ingredient_id), 0) + delta, 0
+                        )
+                    )
+                    for user_id in user_ids
+                    for ingredient_id, delta in deltas.items()
+                ),
+                update_conflicts=True,
+                unique_fields=('user', 'ingredient'),
+                update_fields=('amount',)
+            )
+            self.filter(user_id__in=user_ids, amount=0).delete()
+
+
+class ShoppingCartIngredient(Model):
+    """
+    Сводный список покупок: суммарное количество каждого ингредиента
+    из всех рецептов в корзине пользователя.
+    """
+    user = ForeignKey(
+        to=User,
+        on_delete=CASCADE,
+        related_name='shopping_list',
+        verbose_name='Пользователь',
+        blank=False,
+        null=False
+    )
+    ingredient = ForeignKey(
+        to=Ingredient,
+        on_delete=CASCADE,
+        related_name='in_shopping_lists',
+        verbose_name='Ингредиент',
+        blank=False,
+        null=False
+    )
+    amount = PositiveIntegerField(
+        verbose_name='Количество',
+        blank=False,
+        null=False
+    )
+
+    objects = ShoppingCartIngredientManager()
+
+    class Meta:
+        verbose_name = 'Ингредиент в списке покупок'
+        verbose_name_plural = 'Сводные списки покупок'
+        ordering = ('user', 'ingredient')
+        constraints = (UniqueConstraint(
+            fields=('user', 'ingredient'),
+            name='Ingredient is summed once per user.'
+        ),)
+
+    def __str__(self):
+        return (
+            f'{self.user.get_username()} купит {self.amount} '
+            f'{self.ingredient}'
+        )
@@ -0,0 +1,172 @@
+import re
+
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db.models import F, Q
+
+SEARCH_CONFIG = 'russian'
+
+POSTGRESQL_SEARCH_SQL = (
+    f'''
+    CREATE OR REPLACE FUNCTION recipes_recipe_search_vector_update()
+    RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector :=
+            setweight(
+                to_tsvector('{SEARCH_CONFIG}', coalesce(NEW.name, '')), 'A'
+            ) ||
+            setweight(
+                to_tsvector('{SEARCH_CONFIG}', coalesce(NEW.text, '')), 'B'
+            );
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql;
+    ''',
+    '''
+    CREATE OR REPLACE TRIGGER recipes_recipe_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF name, text ON recipes_recipe
+    FOR EACH ROW EXECUTE FUNCTION recipes_recipe_search_vector_update();
+    ''',
+    '''
+    CREATE INDEX IF NOT EXISTS recipes_recipe_search_vector_gin
+    ON recipes_recipe USING gin (search_vector);
+    ''',
+)
+
+POSTGRESQL_DROP_SEARCH_SQL = (
+    'DROP INDEX IF EXISTS recipes_recipe_search_vector_gin;',
+    'DROP TRIGGER IF EXISTS recipes_recipe_search_vector_trigger '
+    'ON recipes_recipe;',
+    'DROP FUNCTION IF EXISTS recipes_recipe_search_vector_update();',
+)
+
+SQLITE_SEARCH_SQL = (
+    '''
+    CREATE VIRTUAL TABLE IF NOT EXISTS recipes_recipe_fts USING fts5(
+        name, text, content='recipes_recipe', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    );
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS recipes_recipe_fts_insert
+    AFTER INSERT ON recipes_recipe BEGIN
+        INSERT INTO recipes_recipe_fts (rowid, name, text)
+        VALUES (new.id, new.name, new.text);
+    END;
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS recipes_recipe_fts_delete
+    AFTER DELETE ON recipes_recipe BEGIN
+        INSERT INTO recipes_recipe_fts (recipes_recipe_fts, rowid, name, text)
+        VALUES ('delete', old.id, old.name, old.text);
+    END;
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS recipes_recipe_fts_update
+    AFTER UPDATE OF name, text ON recipes_recipe BEGIN
+        INSERT INTO recipes_recipe_fts (recipes_recipe_fts, rowid, name, text)
+        VALUES ('delete', old.id, old.name, old.text);
+        INSERT INTO recipes_recipe_fts (rowid, name, text)
+        VALUES (new.id, new.name, new.text);
+    END;
+    ''',
+)
+
+SQLITE_DROP_SEARCH_SQL = (
+    'DROP TRIGGER IF EXISTS recipes_recipe_fts_insert;',
+    'DROP TRIGGER IF EXISTS recipes_recipe_fts_delete;',
+    'DROP TRIGGER IF EXISTS recipes_recipe_fts_update;',
+    'DROP TABLE IF EXISTS recipes_recipe_fts;',
+)
+
+SQLITE_MATCH_WHERE = (
+    'recipes_recipe_fts.rowid = recipes_recipe.id',
+    'recipes_recipe_fts MATCH %s',
+)
+
+SQLITE_RANK_SQL = '-bm25(recipes_recipe_fts, 10.0, 1.0)'
+
+
+def install_search(connection, rebuild=False):
+    """Создаёт поисковый индекс рецептов и поддерживающие его триггеры."""
+    if connection.vendor == 'postgresql':
+        statements = POSTGRESQL_SEARCH_SQL
+        if rebuild:
+            statements += (
+                'UPDATE recipes_recipe SET name = name;',
+            )
+    elif connection.vendor == 'sqlite':
+        statements = SQLITE_SEARCH_SQL
+        if rebuild:
+            statements += (
+                "INSERT INTO recipes_recipe_fts (recipes_recipe_fts) "
+                "VALUES ('rebuild');",
+            )
+    else:
+        return
+    with connection.cursor() as cursor:
+        for statement in statements:
+            cursor.execute(statement)
+
+
+def uninstall_search(connection):
+    statements = {
+        'postgresql': POSTGRESQL_DROP_SEARCH_SQL,
+        'sqlite': SQLITE_DROP_SEARCH_SQL,
+    }.get(connection.vendor, ())
+    with connection.cursor() as cursor:
+        for statement in statements:
+            cursor.execute(statement)
+
+
+def restore_search_triggers(connection):
+    """
+    SQLite при изменении структуры таблицы пересоздаёт её, и триггеры
+    поискового индекса пропадают. Функция возвращает их, если индекс
+    уже создан миграцией.
+    """
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'recipes_recipe_fts';"
+        )
+        if cursor.fetchone() is None:
+            return
+    install_search(connection)
+
+
+def make_fts5_query(value):
+    """
+    Запрос FTS5 из введённой строки: каждое слово ищется по началу,
+    все слова должны встретиться в рецепте. Кавычки не дают символам
+    из ввода пользователя попасть в синтаксис запроса.
+    """
+    words = re.findall(r'\w+', value)
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def search_recipes(queryset, value, connection):
+    """Рецепты, в названии или описании которых встречается value."""
+    if connection.vendor == 'postgresql':
+        query = SearchQuery(
+            value, config=SEARCH_CONFIG, search_type='websearch'
+        )
+        return queryset.filter(search_vector=query).annotate(
+            search_rank=SearchRank(F('search_vector'), query)
+        ).order_by('-search_rank', '-pub_date')
+    if connection.vendor != 'sqlite':
+        return queryset.filter(
+            Q(name__icontains=value) | Q(text__icontains=value)
+        )
+    query = make_fts5_query(value)
+    if not query:
+        return queryset.none()
+    # Таблица FTS5 присоединяется к рецептам, чтобы поиск и оценка
+    # релевантности выполнялись за один проход по индексу: подзапрос
+    # с bm25() для каждой строки выполнял бы MATCH заново.
+    return queryset.extra(
+        tables=('recipes_recipe_fts',),
+        where=SQLITE_MATCH_WHERE,
+        params=(query,),
+        select={'search_rank': SQLITE_RANK_SQL},
+    ).order_by('-search_rank', '-pub_date')
@@ -6,7 +6,8 @@ from users.models import Follow, User
 @register(User)
 class UserAdmin(ModelAdmin):
     list_display = (
-        'username', 'email', 'first_name', 'last_name', 'is_active'
+        'username', 'email', 'first_name', 'last_name', 'is_active',
+        'followers_count', 'recipes_count'
     )
     list_editable = ('is_active',)
     search_fields = ('username', 'email')
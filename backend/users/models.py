@@ -1,6 +1,7 @@
 from django.contrib.auth.models import AbstractUser
 from django.db.models import (CASCADE, CharField, CheckConstraint, EmailField,
-                              F, ForeignKey, Model, Q, UniqueConstraint)
+                              F, ForeignKey, Model, PositiveIntegerField, Q,
+                              UniqueConstraint)
 
 
 class User(AbstractUser):
@@ -28,6 +29,16 @@ class User(AbstractUser):
         blank=False,
         null=False
     )
+    followers_count = PositiveIntegerField(
+        verbose_name='Подписчиков',
+        default=0,
+        editable=False
+    )
+    recipes_count = PositiveIntegerField(
+        verbose_name='Рецептов',
+        default=0,
+        editable=False
+    )
 
     class Meta:
         verbose_name = 'Пользователь',